@@ -1,4 +1,5 @@
 import subprocess
+import subprocess_runner
 from pathlib import Path
 import argparse
 import sys
@@ -40,17 +41,15 @@ class Audio_mixer:
             print(' '.join(ffmpeg_cmd))
 
             # Execute the FFmpeg command
-            process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            process = subprocess_runner.Popen(ffmpeg_cmd, stage='mix', stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                              text=True)
 
             # Capture and print FFmpeg output in real-time
-            while True:
-                output = process.stderr.readline()
-                if output == '' and process.poll() is not None:
-                    break
-                if output:
+            for output in process.stderr:
+                if output.strip():
                     print(output.strip())
 
-            return_code = process.poll()
+            return_code = process.wait()
             if return_code != 0:
                 print(f"[Error] FFmpeg exited with code {return_code} for '{audio_path.name}'.")
             else:
@@ -1,8 +1,75 @@
 import os
+import json
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pydub import AudioSegment
 
 class Audio_mod:
 
+    def __init__(self, block_frames=65536):
+        """
+        :param block_frames: Number of PCM frames copied per read/write when
+                             streaming a WAV file (memory use is bounded by this).
+        """
+        self.block_frames = block_frames
+
+    def add_silence_gap_wav(self, input_path, output_path, gap_duration_ms=700, interval_ms=60000):
+        """
+        Streams a PCM WAV file to output_path, inserting a silence gap after every interval.
+        Fixed-size blocks of frames are copied straight from input to output and the gap is
+        written from a pre-zeroed buffer, so memory stays flat whatever the length of the audio.
+
+        :param input_path: Path to the source WAV file.
+        :param output_path: Path of the modified WAV file.
+        :param gap_duration_ms: Duration of the silence gap in milliseconds.
+        :param interval_ms: Interval after which to insert the silence in milliseconds.
+        :raises wave.Error: If the file is not a PCM WAV the wave module can read.
+        """
+        temp_path = f"{output_path}.tmp"
+        try:
+            with wave.open(input_path, 'rb') as source:
+                params = source.getparams()
+                frame_rate = params.framerate
+                frame_size = params.nchannels * params.sampwidth
+                total_frames = params.nframes
+
+                # Same millisecond to frame conversion pydub uses for slicing
+                interval_frames = int(interval_ms * frame_rate / 1000.0)
+                gap_frames = int(gap_duration_ms * frame_rate / 1000.0)
+                if interval_frames <= 0:
+                    raise ValueError("interval_ms must be long enough to hold at least one frame.")
+
+                # 8-bit WAV is unsigned, so its silence is 0x80 rather than 0
+                silence_byte = b'\x80' if params.sampwidth == 1 else b'\x00'
+                silence = silence_byte * (gap_frames * frame_size)
+
+                with wave.open(temp_path, 'wb') as target:
+                    target.setparams(params)
+                    copied = 0
+                    while copied < total_frames:
+                        chunk_end = min(copied + interval_frames, total_frames)
+                        while copied < chunk_end:
+                            frames = source.readframes(min(self.block_frames, chunk_end - copied))
+                            if not frames:
+                                # Header claimed more frames than the file holds
+                                total_frames = copied
+                                break
+                            target.writeframesraw(frames)
+                            copied += len(frames) // frame_size
+
+                        # Check if there's more audio to process
+                        if copied < total_frames:
+                            target.writeframesraw(silence)
+
+            os.replace(temp_path, output_path)
+        except BaseException:
+            # Never leave a half written file next to the episode audio
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
     def add_silence_gap(self, audio, gap_duration_ms=700, interval_ms=60000):
         """
         Inserts a silence gap into the audio after every interval.
@@ -32,7 +99,68 @@ class Audio_mod:
 
         return output
 
-    def process_audio_files(self, input_folder='audio', output_suffix='_modified', gap_ms=200, interval_ms=60000):
+    def process_audio_file(self, input_folder, file_name, output_suffix='_modified', gap_ms=200, interval_ms=60000):
+        """
+        Adds silence gaps to a single WAV file, isolating any failure to that file.
+
+        :return: Dictionary with file, ok, error, seconds (wall time), bytes (input size)
+                 and mb_per_s (input throughput).
+        """
+        input_path = os.path.join(input_folder, file_name)
+        print(f"Processing '{input_path}'...")
+        start = time.perf_counter()
+        result = {'file': file_name, 'ok': False, 'error': None, 'bytes': 0}
+
+        try:
+            result['bytes'] = os.path.getsize(input_path)
+
+            # Prepare the output file name
+            name, ext = os.path.splitext(file_name)
+            output_file_name = f"{name}{output_suffix}{ext}"
+            output_path = os.path.join(input_folder, output_file_name)
+
+            try:
+                # Stream the PCM frames straight to the output (overwrites if already exists)
+                self.add_silence_gap_wav(input_path, output_path, gap_duration_ms=gap_ms, interval_ms=interval_ms)
+            except wave.Error as e:
+                # Formats the wave module cannot read (e.g. float or extensible WAV) go through pydub
+                print(f"Falling back to pydub for '{file_name}': {e}")
+                audio = AudioSegment.from_wav(input_path)
+                modified_audio = self.add_silence_gap(audio, gap_duration_ms=gap_ms, interval_ms=interval_ms)
+                modified_audio.export(output_path, format="wav")
+
+            print(f"Saved modified audio as '{output_path}'.\n")
+            result['ok'] = True
+
+        except Exception as e:
+            print(f"Failed to process '{file_name}': {e}\n")
+            result['error'] = str(e)
+
+        result['seconds'] = time.perf_counter() - start
+        result['mb_per_s'] = (result['bytes'] / 1e6) / result['seconds'] if result['seconds'] > 0 else 0.0
+        return result
+
+    def print_summary(self, results, summary_path=None):
+        """
+        Prints per-file wall time and throughput, optionally writing them as JSON.
+        """
+        print(f"{'File':<40} {'Status':<8} {'Seconds':>9} {'MB':>9} {'MB/s':>9}")
+        for r in results:
+            status = 'ok' if r['ok'] else 'failed'
+            print(f"{r['file'][:40]:<40} {status:<8} {r['seconds']:>9.2f} {r['bytes'] / 1e6:>9.1f} {r['mb_per_s']:>9.1f}")
+
+        total_bytes = sum(r['bytes'] for r in results if r['ok'])
+        total_seconds = sum(r['seconds'] for r in results)
+        print(f"{len([r for r in results if r['ok']])}/{len(results)} files, "
+              f"{total_bytes / 1e6:.1f} MB in {total_seconds:.2f}s of worker time")
+
+        if summary_path:
+            with open(summary_path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            print(f"Saved processing summary as '{summary_path}'.")
+
+    def process_audio_files(self, input_folder='audio', output_suffix='_modified', gap_ms=200, interval_ms=60000,
+                            max_workers=1, summary_path=None):
         """
         Processes all WAV files in the specified folder by adding silence gaps.
 
@@ -40,11 +168,15 @@ class Audio_mod:
         :param output_suffix: Suffix to add to the output file names.
         :param gap_ms: Duration of the silence gap in milliseconds.
         :param interval_ms: Interval after which to insert the silence in milliseconds.
+        :param max_workers: Number of files processed at the same time in a process pool
+                            (1 processes them one by one in this process).
+        :param summary_path: Optional JSON file for the per-file timing summary.
+        :return: List of per-file results (see process_audio_file).
         """
         # Ensure the input folder exists
         if not os.path.isdir(input_folder):
             print(f"Input folder '{input_folder}' does not exist.")
-            return
+            return []
 
         # List all WAV files in the input folder excluding those already modified
         wav_files = [
@@ -54,27 +186,47 @@ class Audio_mod:
 
         if not wav_files:
             print(f"No unmodified WAV files found in '{input_folder}' folder.")
-            return
-
-        for file_name in wav_files:
-            input_path = os.path.join(input_folder, file_name)
-            print(f"Processing '{input_path}'...")
-
-            try:
-                # Load the audio file
-                audio = AudioSegment.from_wav(input_path)
-
-                # Add silence gaps
-                modified_audio = self.add_silence_gap(audio, gap_duration_ms=gap_ms, interval_ms=interval_ms)
-
-                # Prepare the output file name
-                name, ext = os.path.splitext(file_name)
-                output_file_name = f"{name}{output_suffix}{ext}"
-                output_path = os.path.join(input_folder, output_file_name)
-
-                # Export the modified audio (overwrites if already exists)
-                modified_audio.export(output_path, format="wav")
-                print(f"Saved modified audio as '{output_path}'.\n")
+            return []
+
+        args = [(input_folder, file_name, output_suffix, gap_ms, interval_ms) for file_name in wav_files]
+        if max_workers and max_workers > 1 and len(wav_files) > 1:
+            results = self._run_pool(args, min(max_workers, len(wav_files)))
+            # A worker that dies (e.g. killed for memory) breaks the whole pool and fails
+            # every unfinished file with it, so those are run again one per fresh pool,
+            # where a death can only be charged to the file that caused it
+            for i in [i for i, result in enumerate(results) if result is None]:
+                results[i] = self._run_pool(args[i:i + 1], 1)[0]
+                if results[i] is None:
+                    print(f"Failed to process '{wav_files[i]}': its worker process died\n")
+                    results[i] = {'file': wav_files[i], 'ok': False, 'error': 'worker process died',
+                                  'bytes': 0, 'seconds': 0.0, 'mb_per_s': 0.0}
+        else:
+            results = [self.process_audio_file(*arg) for arg in args]
+
+        self.print_summary(results, summary_path)
+        return results
+
+
+    def _run_pool(self, args, max_workers):
+        """
+        Process the files of args in a process pool.
 
-            except Exception as e:
-                print(f"Failed to process '{file_name}': {e}\n")
\ No newline at end of file
+        :return: List of per-file results, None for the files that did not finish because
+                 a worker process died and broke the pool.
+        """
+        results = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_process_audio_file, self.block_frames, *arg) for arg in args]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except BrokenProcessPool:
+                    results.append(None)
+        return results
+
+
+def _process_audio_file(block_frames, *args):
+    """
+    Process pool entry point: process one WAV file.
+    """
+    return Audio_mod(block_frames).process_audio_file(*args)
@@ -0,0 +1,496 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import subprocess
+from profiling import PROFILE_ENV
+from file_utils import write_json_atomic
+
+# Episode lengths benchmarked by default, in minutes
+DEFAULT_MINUTES = [1, 10, 60, 180]
+STAGES = ['scan', 'sequence', 'concat', 'combine', 'audio_mod', 'mix']
+
+# Stages holding media in memory, and the episode lengths they are measured at by --memory
+MEMORY_STAGES = ['audio_mod', 'audio_mod_pydub', 'girl', 'man', 'mv_combine']
+DEFAULT_MEMORY_MINUTES = [1, 2, 4, 8]
+MEMORY_METRICS = ['heap_peak_mb', 'rss_growth_mb', 'child_rss_peak_mb']
+# Largest peak of any metric of a stage, in MB
+MEMORY_BUDGET_MB = 2048
+# Largest exponent of peak memory against episode length still counted as linear growth
+MAX_GROWTH_EXPONENT = 1.25
+# Growth over the shortest episode below this is measurement noise and is left out of the fit
+MIN_GROWTH_MB = 1
+
+# Same categories Sequencer.plan_sequence picks from, with stand-in clip lengths in seconds
+ANIMATIONS = {
+    'man': {'yes_long': 2.5, 'fill': 1.5, 'sip_coffee': 3.0, 'nod': 1.0},
+    'girl': {'yes_long': 2.5, 'fill': 1.5, 'nod': 1.0}
+}
+LIP_FILES = ('_with_lip_move.mp4', '_without_lip_move.mp4')
+
+WORDS = ('so', 'the', 'match', 'was', 'decided', 'in', 'a', 'single', 'move', 'and',
+         'nobody', 'saw', 'it', 'coming', 'right', 'well', 'that', 'is', 'what', 'makes')
+
+def format_timestamp(ms):
+    """
+    Milliseconds as the h:mm:ss:ms timestamp of the transcript SPEAKER lines.
+    """
+    seconds, ms = divmod(int(ms), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}:{ms:03d}"
+
+def synth_transcript(path, minutes, turn_seconds=8.0, seed=0):
+    """
+    Write a transcript of two alternating speakers covering `minutes`.
+
+    :param turn_seconds: Mean length of a speaker turn (lower means denser turns).
+                         Turn lengths are drawn exponentially around it, with a floor
+                         of a quarter of it.
+    :return: Number of turns written.
+    """
+    rng = random.Random(seed)
+    total_ms = int(minutes * 60000)
+    at_ms = 0
+    turns = 0
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        while at_ms < total_ms:
+            f.write(f"SPEAKER {turns % 2 + 1} {format_timestamp(at_ms)}\n")
+            f.write(' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))) + ' \n')
+            turn_ms = max(turn_seconds / 4.0, rng.expovariate(1.0 / turn_seconds)) * 1000
+            at_ms += int(turn_ms)
+            turns += 1
+    return turns
+
+def synth_animation_library(base_path, size='320x180', fps=24):
+    """
+    Generate a stand-in animation library with ffmpeg lavfi test sources, laid out like
+    the real one: `{base_path}/{man,girl}/<category>/_with(out)_lip_move.mp4`, H.264
+    video and stereo AAC audio. Existing clips are kept.
+
+    :return: Number of clips generated.
+    """
+    generated = 0
+    for gender, categories in ANIMATIONS.items():
+        for category, seconds in categories.items():
+            folder = os.path.join(base_path, gender, category)
+            os.makedirs(folder, exist_ok=True)
+            for lip_file in LIP_FILES:
+                path = os.path.join(folder, lip_file)
+                if os.path.isfile(path):
+                    continue
+                subprocess.run([
+                    'ffmpeg', '-y', '-v', 'error',
+                    '-f', 'lavfi', '-i', f"testsrc2=size={size}:rate={fps}:duration={seconds}",
+                    '-f', 'lavfi', '-i', f"anullsrc=channel_layout=stereo:sample_rate=44100",
+                    '-map', '0:v', '-map', '1:a', '-t', str(seconds),
+                    '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+                    '-c:a', 'aac',
+                    path
+                ], check=True)
+                generated += 1
+    return generated
+
+def synth_audio(path, minutes, sample_rate=16000):
+    """
+    Write a mono PCM WAV tone covering `minutes` as the episode audio.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f"sine=frequency=220:sample_rate={sample_rate}:duration={minutes * 60}",
+        '-ac', '1', '-c:a', 'pcm_s16le',
+        path
+    ], check=True)
+
+def prepare_workspace(work_dir, library_dir, minutes, turn_seconds, sample_rate, seed):
+    """
+    Fresh episode folder with a synthetic transcript and audio, sharing the animation
+    library through a symlink.
+
+    :return: Number of transcript turns.
+    """
+    if os.path.isdir(work_dir):
+        shutil.rmtree(work_dir)
+    os.makedirs(work_dir)
+    os.symlink(os.path.abspath(library_dir), os.path.join(work_dir, 'animations'))
+    # Folders the stages expect to exist, as in the repository
+    for folder in ('combined_video', 'output'):
+        os.makedirs(os.path.join(work_dir, folder))
+    turns = synth_transcript(os.path.join(work_dir, 'transcript', 'transcript.txt'), minutes, turn_seconds, seed)
+    synth_audio(os.path.join(work_dir, 'audio', 'episode.wav'), minutes, sample_rate)
+    return turns
+
+def run_stages(work_dir, jobs, seed):
+    """
+    Time every stage of the trims pipeline in work_dir. Runs in a fresh interpreter
+    (see run_benchmark): the stage modules read the transcript of the working
+    directory when they are imported.
+
+    :return: Dictionary of stage -> seconds, plus the subprocess summary per stage.
+    """
+    os.chdir(work_dir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    random.seed(seed)
+
+    import subprocess_runner
+    from profiling import profile_stage
+    subprocess_runner.start_trace('trace.json')
+
+    from pathlib import Path
+    from scan_path import ScanPath
+    from sequencer import Sequencer
+    from concat_videos import Concat_vids
+    from combine import Combine_vids
+    from audio_mod import Audio_mod
+    from audio_mixer import Audio_mixer
+
+    def scan():
+        # Probe the library cold, as a new library would be
+        if os.path.isfile(os.path.join('animations', ScanPath.CACHE_FILENAME)):
+            os.remove(os.path.join('animations', ScanPath.CACHE_FILENAME))
+        ScanPath().scan_animations_directory_with_duration_ms('animations')
+
+    def sequence():
+        for is_speaker1_man, role in ((True, 'female'), (False, 'male')):
+            Sequencer(is_speaker1_man).create_sequence(role, max_workers=jobs, threads_per_job=1)
+
+    def mix():
+        Audio_mixer().join_audio_video_ffmpeg(Path('combined_video/combined_video.mp4'),
+                                              Path('audio/episode_modified.wav'),
+                                              Path('output/episode_modified_output.mp4'))
+
+    stages = {
+        'scan': scan,
+        'sequence': sequence,
+        'concat': lambda: Concat_vids().concat_vids(),
+        'combine': lambda: Combine_vids().run_combine(),
+        'audio_mod': lambda: Audio_mod().process_audio_files(),
+        'mix': mix
+    }
+    timings = {}
+    for name in STAGES:
+        start = time.perf_counter()
+        with profile_stage(name):
+            stages[name]()
+        timings[name] = round(time.perf_counter() - start, 4)
+        print(f"[Bench] {name}: {timings[name]:.2f}s")
+    return {'stages': timings, 'subprocesses': subprocess_runner.summarize('trace.json')}
+
+def _maxrss_mb(who):
+    # ru_maxrss is in kilobytes on Linux
+    import resource
+    return resource.getrusage(who).ru_maxrss / 1024.0
+
+def measure_memory(work_dir, stage, minutes, seed):
+    """
+    Run one memory-heavy stage in work_dir and record its peaks: the Python heap
+    (tracemalloc), the growth of the process RSS over what imports and setup used,
+    and the largest RSS of a child process (ffmpeg). Runs in a fresh interpreter
+    (see run_memory_benchmark), as RSS peaks are per process.
+
+    :return: Dictionary of MEMORY_METRICS plus seconds.
+    """
+    import resource
+    import tracemalloc
+    os.chdir(work_dir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    random.seed(seed)
+    total_duration = minutes * 60
+
+    if stage == 'audio_mod':
+        from audio_mod import Audio_mod
+        run = lambda: Audio_mod().process_audio_files()
+    elif stage == 'audio_mod_pydub':
+        from pydub import AudioSegment
+        from audio_mod import Audio_mod
+
+        def run():
+            # The fallback of Audio_mod.process_audio_file for WAV files the wave module cannot read
+            audio = AudioSegment.from_wav('audio/episode.wav')
+            Audio_mod().add_silence_gap(audio, gap_duration_ms=200).export('audio/episode_modified.wav', format='wav')
+    elif stage == 'girl':
+        from girl import run_girl
+        run = lambda: run_girl(total_duration, 'transcript/transcript.txt', 'animations/girl', 0.30, 0.25, 0.75)
+    elif stage == 'man':
+        from man import run_man
+        run = lambda: run_man(total_duration, 'transcript/transcript.txt', 'animations/man', 0.20, 0.30, 0.25, 0.75)
+    elif stage == 'mv_combine':
+        from mv_combine import combine_videos
+        # Stand-in trims: library clips in turn until the episode is covered
+        clips = sorted(os.path.join(root, name) for root, _, names in os.walk('animations', followlinks=True)
+                       for name in names if name.endswith('.mp4'))
+        durations = [ANIMATIONS[path.split(os.sep)[1]][path.split(os.sep)[2]] for path in clips]
+        os.makedirs('clips')
+        covered, n = 0.0, 0
+        while covered < total_duration:
+            os.symlink(os.path.abspath(clips[n % len(clips)]), os.path.join('clips', f"video{n + 1}.mp4"))
+            covered += durations[n % len(clips)]
+            n += 1
+        run = lambda: combine_videos('clips', 'combined_video.mp4')
+    else:
+        raise ValueError(f"Unknown memory stage '{stage}'. Available: {MEMORY_STAGES}")
+
+    rss_before = _maxrss_mb(resource.RUSAGE_SELF)
+    tracemalloc.start()
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'heap_peak_mb': round(heap_peak / (1024.0 * 1024.0), 2),
+        'rss_growth_mb': round(_maxrss_mb(resource.RUSAGE_SELF) - rss_before, 2),
+        'child_rss_peak_mb': round(_maxrss_mb(resource.RUSAGE_CHILDREN), 2),
+        'seconds': round(seconds, 4)
+    }
+
+def growth_exponent(points):
+    """
+    Least squares slope of log(peak growth) against log(length growth), both taken over
+    the shortest episode so the fixed cost of a stage (imports, decoder buffers) does not
+    flatten the fit: about 1 for linear growth, up to 2 for quadratic. Points that grew
+    less than MIN_GROWTH_MB are left out.
+
+    :param points: List of (minutes, peak MB).
+    :return: Exponent, or None with fewer than two points to fit.
+    """
+    import math
+    if not points:
+        return None
+    base_minutes, base_peak = min(points)
+    points = [(math.log(minutes - base_minutes), math.log(peak - base_peak)) for minutes, peak in points
+              if minutes > base_minutes and peak - base_peak >= MIN_GROWTH_MB]
+    if len(points) < 2 or len({x for x, _ in points}) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    return (sum((x - mean_x) * (y - mean_y) for x, y in points)
+            / sum((x - mean_x) ** 2 for x, _ in points))
+
+def run_memory_benchmark(minutes_list, stages=None, bench_dir='bench', turn_seconds=8.0, size='320x180',
+                         sample_rate=16000, seed=0, budget_mb=MEMORY_BUDGET_MB,
+                         max_exponent=MAX_GROWTH_EXPONENT, keep=False):
+    """
+    Measure the memory peaks of every memory-heavy stage at every episode length and
+    check them: a stage fails when a peak exceeds budget_mb or when a peak grows faster
+    than length ** max_exponent.
+
+    :return: Results dictionary; 'failures' lists what failed.
+    """
+    stages = stages or MEMORY_STAGES
+    library_dir = os.path.join(bench_dir, 'animations')
+    print(f"[Bench] Generating the animation library in '{library_dir}'...")
+    synth_animation_library(library_dir, size=size)
+
+    results = {
+        'config': {'turn_seconds': turn_seconds, 'size': size, 'sample_rate': sample_rate, 'seed': seed,
+                   'budget_mb': budget_mb, 'max_exponent': max_exponent},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpu_count': os.cpu_count()},
+        'stages': {},
+        'failures': []
+    }
+    print(f"[Bench] {'stage':<16}{'length':>10}{'heap MB':>12}{'RSS+ MB':>12}{'child MB':>12}{'wall':>11}")
+    for stage in stages:
+        runs = []
+        for minutes in minutes_list:
+            work_dir = os.path.abspath(os.path.join(bench_dir, 'work', f"memory_{stage}_{minutes}min"))
+            prepare_workspace(work_dir, library_dir, minutes, turn_seconds, sample_rate, seed)
+            result_file = os.path.join(work_dir, 'result.json')
+            # The stages are chatty; their output goes to the log of the run
+            with open(os.path.join(work_dir, 'worker.log'), 'w', encoding='utf-8') as log:
+                worker = subprocess.run([
+                    sys.executable, os.path.abspath(__file__), '--worker', work_dir,
+                    '--memory-stage', stage, '--minutes', str(minutes), '--seed', str(seed), '--result', result_file
+                ], stdout=log, stderr=subprocess.STDOUT)
+            if worker.returncode != 0:
+                results['failures'].append(f"{stage} at {minutes} min: worker failed (see {work_dir}/worker.log)")
+                print(f"[Bench] {stage} at {minutes} min: worker failed (see {work_dir}/worker.log)")
+                keep_dir = True
+            else:
+                with open(result_file, 'r', encoding='utf-8') as f:
+                    run = dict(json.load(f), minutes=minutes)
+                runs.append(run)
+                print(f"[Bench] {stage:<16}{minutes:>6} min" + ''.join(f"{run[m]:>12.1f}" for m in MEMORY_METRICS)
+                      + f"{run['seconds']:>10.2f}s")
+                keep_dir = keep
+                for metric in MEMORY_METRICS:
+                    if run[metric] > budget_mb:
+                        results['failures'].append(
+                            f"{stage} at {minutes} min: {metric} {run[metric]:.1f} MB over the {budget_mb} MB budget")
+            if not keep_dir:
+                shutil.rmtree(work_dir)
+
+        exponents = {metric: growth_exponent([(run['minutes'], run[metric]) for run in runs])
+                     for metric in MEMORY_METRICS}
+        for metric, exponent in exponents.items():
+            if exponent is not None and exponent > max_exponent:
+                results['failures'].append(
+                    f"{stage}: {metric} grows super-linearly with episode length (exponent {exponent:.2f})")
+        results['stages'][stage] = {'runs': runs, 'exponents': exponents}
+    return results
+
+def run_benchmark(minutes_list, bench_dir='bench', turn_seconds=8.0, size='320x180', sample_rate=16000,
+                  jobs=None, seed=0, keep=False, profile_dir=None):
+    """
+    Benchmark the pipeline at every episode length of minutes_list.
+
+    :param profile_dir: When set, every stage is profiled (see profiling.profile_stage)
+                        into `{profile_dir}/<minutes>min`. Profiling slows the stages down.
+
+    :return: Results dictionary (see compare_to_baseline).
+    """
+    jobs = jobs or os.cpu_count() or 1
+    library_dir = os.path.join(bench_dir, 'animations')
+    print(f"[Bench] Generating the animation library in '{library_dir}'...")
+    synth_animation_library(library_dir, size=size)
+
+    runs = []
+    for minutes in minutes_list:
+        work_dir = os.path.abspath(os.path.join(bench_dir, 'work', f"{minutes}min"))
+        turns = prepare_workspace(work_dir, library_dir, minutes, turn_seconds, sample_rate, seed)
+        print(f"\n[Bench] {minutes} min episode, {turns} turns")
+        result_file = os.path.join(work_dir, 'result.json')
+        env = dict(os.environ)
+        if profile_dir:
+            env[PROFILE_ENV] = os.path.abspath(os.path.join(profile_dir, f"{minutes}min"))
+        subprocess.run([
+            sys.executable, os.path.abspath(__file__), '--worker', work_dir,
+            '--jobs', str(jobs), '--seed', str(seed), '--result', result_file
+        ], check=True, env=env)
+        with open(result_file, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        result.update({'minutes': minutes, 'turns': turns, 'total': round(sum(result['stages'].values()), 4)})
+        runs.append(result)
+        if not keep:
+            shutil.rmtree(work_dir)
+
+    return {
+        'config': {'turn_seconds': turn_seconds, 'size': size, 'sample_rate': sample_rate, 'jobs': jobs,
+                   'seed': seed},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpu_count': os.cpu_count()},
+        'runs': runs
+    }
+
+def compare_to_baseline(results, baseline, tolerance=0.2, min_seconds=0.1):
+    """
+    Compare the stage timings of results against a baseline of the same layout.
+
+    :param tolerance: Relative slowdown tolerated before a stage counts as a regression.
+    :param min_seconds: Absolute slowdown below which a stage never counts as one
+                        (timer noise on stages that take milliseconds).
+    :return: List of (minutes, stage, baseline seconds, seconds, ratio, regressed).
+    """
+    baseline_runs = {run['minutes']: run for run in baseline['runs']}
+    rows = []
+    for run in results['runs']:
+        base = baseline_runs.get(run['minutes'])
+        if not base:
+            continue
+        for stage in STAGES + ['total']:
+            seconds = run['stages'].get(stage) if stage != 'total' else run['total']
+            base_seconds = base['stages'].get(stage) if stage != 'total' else base['total']
+            if seconds is None or not base_seconds:
+                continue
+            ratio = seconds / base_seconds
+            regressed = ratio > 1 + tolerance and seconds - base_seconds > min_seconds
+            rows.append((run['minutes'], stage, base_seconds, seconds, ratio, regressed))
+    return rows
+
+def print_results(results, rows=None):
+    print(f"\n[Bench] {'minutes':>7}{'turns':>7}" + ''.join(f"{stage:>11}" for stage in STAGES) + f"{'total':>11}")
+    for run in results['runs']:
+        print(f"[Bench] {run['minutes']:>7}{run['turns']:>7}"
+              + ''.join(f"{run['stages'][stage]:>11.2f}" for stage in STAGES) + f"{run['total']:>11.2f}")
+    if rows:
+        print(f"\n[Bench] Against baseline:")
+        for minutes, stage, base_seconds, seconds, ratio, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            print(f"[Bench] {minutes:>5} min {stage:<10}{base_seconds:>9.2f}s ->{seconds:>9.2f}s  x{ratio:.2f}{flag}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark on synthetic episodes.")
+    parser.add_argument('--minutes', type=float, nargs='+', default=None,
+                        help=f"Episode lengths to benchmark (default: {DEFAULT_MINUTES}, "
+                             f"{DEFAULT_MEMORY_MINUTES} with --memory).")
+    parser.add_argument('--turn-seconds', type=float, default=8.0,
+                        help="Mean length of a speaker turn in seconds (default: 8).")
+    parser.add_argument('--size', default='320x180', help="Size of the stand-in clips (default: 320x180).")
+    parser.add_argument('--sample-rate', type=int, default=16000,
+                        help="Sample rate of the episode audio (default: 16000).")
+    parser.add_argument('--jobs', type=int, default=None, help="Trim workers (default: CPU count).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the transcripts and of the sequencing.")
+    parser.add_argument('--bench-dir', default='bench', help="Folder of the library and the episodes (default: bench).")
+    parser.add_argument('--output', default=None,
+                        help="Results file (default: bench/results.json, bench/memory.json with --memory).")
+    parser.add_argument('--baseline', default='bench/baseline.json',
+                        help="Baseline to compare against (default: bench/baseline.json).")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Relative slowdown counted as a regression (default: 0.2).")
+    parser.add_argument('--keep', action='store_true', help="Keep the episode folders.")
+    parser.add_argument('--profile', metavar='DIR',
+                        help="Profile every stage into DIR/<minutes>min (.prof and collapsed stacks).")
+    parser.add_argument('--memory', action='store_true',
+                        help="Measure the memory peaks of the memory-heavy stages instead of timing the pipeline.")
+    parser.add_argument('--memory-stages', nargs='+', choices=MEMORY_STAGES, default=None,
+                        help=f"Stages measured by --memory (default: all of {MEMORY_STAGES}).")
+    parser.add_argument('--budget-mb', type=float, default=MEMORY_BUDGET_MB,
+                        help=f"Memory budget of a stage in MB (default: {MEMORY_BUDGET_MB}).")
+    parser.add_argument('--max-exponent', type=float, default=MAX_GROWTH_EXPONENT,
+                        help=f"Largest growth exponent counted as linear (default: {MAX_GROWTH_EXPONENT}).")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--memory-stage', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        if args.memory_stage:
+            result = measure_memory(args.worker, args.memory_stage, args.minutes[0], args.seed)
+        else:
+            result = run_stages(args.worker, args.jobs, args.seed)
+        write_json_atomic(result, args.result, indent=2)
+        return 0
+
+    minutes_list = args.minutes or (DEFAULT_MEMORY_MINUTES if args.memory else DEFAULT_MINUTES)
+    minutes_list = [int(m) if float(m).is_integer() else m for m in minutes_list]
+
+    if args.memory:
+        output = args.output or 'bench/memory.json'
+        results = run_memory_benchmark(minutes_list, stages=args.memory_stages, bench_dir=args.bench_dir,
+                                       turn_seconds=args.turn_seconds, size=args.size,
+                                       sample_rate=args.sample_rate, seed=args.seed, budget_mb=args.budget_mb,
+                                       max_exponent=args.max_exponent, keep=args.keep)
+        write_json_atomic(results, output, indent=2)
+        for failure in results['failures']:
+            print(f"[Bench] FAILED {failure}")
+        print(f"\n[Bench] Memory results saved to {output}")
+        return 1 if results['failures'] else 0
+    results = run_benchmark(minutes_list, bench_dir=args.bench_dir, turn_seconds=args.turn_seconds,
+                            size=args.size, sample_rate=args.sample_rate, jobs=args.jobs, seed=args.seed,
+                            keep=args.keep, profile_dir=args.profile)
+    output = args.output or 'bench/results.json'
+    write_json_atomic(results, output, indent=2)
+
+    rows = None
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            rows = compare_to_baseline(results, json.load(f), args.tolerance)
+    print_results(results, rows)
+    print(f"\n[Bench] Results saved to {output}")
+
+    if args.save_baseline:
+        write_json_atomic(results, args.baseline, indent=2)
+        print(f"[Bench] Baseline saved to {args.baseline}")
+    return 1 if rows and any(row[-1] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+from collections import OrderedDict
+import numpy as np
+from moviepy.editor import VideoFileClip, concatenate_videoclips
+
+def add_range(ranges, path, start, end, tolerance=1e-6):
+    """
+    Append the source range [start, end) of path to a timeline, extending the last
+    range instead when it is the same source and ends where this one starts.
+
+    :param ranges: Timeline as a list of [path, start, end] in seconds.
+    """
+    if ranges and ranges[-1][0] == path and abs(ranges[-1][2] - start) < tolerance:
+        ranges[-1][2] = end
+    else:
+        ranges.append([path, start, end])
+
+class ClipPool:
+
+    def __init__(self, max_readers=8, **clip_kwargs):
+        """
+        Lazily opened VideoFileClips shared by every subclip taken from the same source.
+
+        A source is opened the first time the timeline asks for it, and the ffmpeg readers
+        moviepy starts while opening it (video and audio) are stopped right away: they only
+        run again when a frame or audio chunk of the source is read. At most max_readers
+        sources have running readers at a time: when another one is needed, both readers
+        of the least recently used source are stopped. Its clip (and every subclip of it)
+        stays valid, the readers restart at the position they stopped on the next read.
+
+        :param max_readers: Cap on sources with running reader processes.
+        :param clip_kwargs: Extra arguments for VideoFileClip.
+        """
+        self.max_readers = max(1, max_readers)
+        self.clip_kwargs = clip_kwargs
+        self._clips = {}
+        self._active = OrderedDict()  # Sources with running readers, least recently used first
+        self.evictions = 0
+        self._building = False
+
+    def get(self, path):
+        """
+        Clip of a source file, opened on first use without running readers.
+        """
+        clip = self._clips.get(path)
+        if clip is None:
+            clip = VideoFileClip(path, **self.clip_kwargs)
+            self._stop_readers(clip)
+            # Route every frame and audio read through the pool, so the render keeps the LRU
+            # order and the reader cap (subclips call the parent's make_frame at read time)
+            read_frame = clip.make_frame
+            clip.make_frame = lambda t: self._read(path, read_frame, t)
+            if clip.audio is not None:
+                read_audio = clip.audio.make_frame
+                clip.audio.make_frame = lambda t: self._read_audio(path, clip.audio.reader, read_audio, t)
+            self._clips[path] = clip
+        return clip
+
+    def _stop_readers(self, clip):
+        """
+        Stop the ffmpeg processes of a clip. The video reader restarts by itself on the
+        next read; the audio reader is restarted by _read_audio.
+        """
+        if clip.reader:
+            clip.reader.close()
+        if clip.audio is not None:
+            clip.audio.reader.close_proc()
+
+    def _read(self, path, read_frame, t):
+        if self._building:
+            # moviepy reads a frame of every new subclip only to learn its size; answer
+            # with a blank frame instead of starting (or seeking) a reader per range
+            width, height = self._clips[path].size
+            return np.zeros((height, width, 3), dtype=np.uint8)
+        self._touch(path)
+        return read_frame(t)
+
+    def _read_audio(self, path, reader, read_audio, t):
+        self._touch(path)
+        if reader.proc is None:
+            # Resume the stream where it was stopped, so the reader's buffer logic carries on
+            reader.initialize(reader.pos / float(reader.fps))
+        return read_audio(t)
+
+    def _touch(self, path):
+        """
+        Mark a source as most recently used and stop readers beyond the cap.
+        """
+        if path in self._active:
+            self._active.move_to_end(path)
+            return
+        self._active[path] = self._clips[path]
+        while len(self._active) > self.max_readers:
+            _, idle_clip = self._active.popitem(last=False)
+            self._stop_readers(idle_clip)
+            self.evictions += 1
+
+    def concatenate(self, ranges):
+        """
+        One clip playing every range of a timeline (see add_range) in order.
+        Uses method="chain" when every source has the same size, "compose" otherwise.
+
+        Building the timeline opens each distinct source once (see get), without
+        leaving reader processes running: readers only start when the result is
+        rendered, and never for more than max_readers sources at a time.
+        """
+        sources = {path: self.get(path) for path in dict.fromkeys(path for path, _, _ in ranges)}
+        self._building = True
+        try:
+            clips = [sources[path].subclip(start, end) for path, start, end in ranges]
+            method = 'chain' if len({tuple(clip.size) for clip in clips}) <= 1 else 'compose'
+            return concatenate_videoclips(clips, method=method)
+        finally:
+            self._building = False
+
+    def stats(self):
+        """
+        :return: Dictionary with the number of opened sources, running readers and evictions.
+        """
+        return {
+            'sources': len(self._clips),
+            'running_readers': len(self._active),
+            'evictions': self.evictions
+        }
+
+    def close(self):
+        """
+        Close every clip of the pool.
+        """
+        for clip in self._clips.values():
+            clip.close()
+        self._clips.clear()
+        self._active.clear()
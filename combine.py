@@ -1,13 +1,18 @@
 import os
 import subprocess
-import json
+import subprocess_runner
 import sys
+from media_probe import MediaProbe
 
 class Combine_vids:
 
+    def __init__(self):
+        # The role tracks are long, so skip listing their packets for keyframes
+        self.probe = MediaProbe(keyframes=False)
+
     def get_video_resolution(self, video_path):
         """
-        Retrieves the width and height of the video using FFprobe.
+        Retrieves the width and height of the video using MediaProbe.
 
         Args:
             video_path (str): Path to the video file.
@@ -18,24 +23,10 @@ class Combine_vids:
         Raises:
             Exception: If FFprobe fails or the video stream is not found.
         """
-        command = [
-            'ffprobe',
-            '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height',
-            '-of', 'json',
-            video_path
-        ]
-        try:
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            info = json.loads(result.stdout)
-            width = info['streams'][0]['width']
-            height = info['streams'][0]['height']
-            return width, height
-        except subprocess.CalledProcessError as e:
-            raise Exception(f"FFprobe error for file {video_path}: {e.stderr}") from e
-        except (KeyError, IndexError, json.JSONDecodeError) as e:
-            raise Exception(f"Unable to parse FFprobe output for file {video_path}") from e
+        resolution = self.probe.get_resolution(video_path)
+        if resolution is None:
+            raise Exception(f"Unable to read the video resolution of {video_path}")
+        return resolution
 
     def crop_and_join_videos(self, female_path, male_path, output_path):
         """
@@ -50,7 +41,8 @@ class Combine_vids:
         Raises:
             ValueError: If video resolutions are incompatible.
         """
-        # Get resolutions
+        # Get resolutions (probed together in one batch)
+        self.probe.probe_many([female_path, male_path])
         female_width, female_height = self.get_video_resolution(female_path)
         male_width, male_height = self.get_video_resolution(male_path)
 
@@ -101,7 +93,7 @@ class Combine_vids:
 
         try:
             # Execute the FFmpeg command
-            subprocess.run(command, check=True)
+            subprocess_runner.run(command, stage='combine', check=True)
             print(f"Successfully saved the joined video to {output_path}")
         except subprocess.CalledProcessError as e:
             print(f"FFmpeg failed with error: {e.stderr}")
@@ -2,19 +2,35 @@ import os
 import re
 import uuid
 import shutil
+import tempfile
 import subprocess
-from math import ceil
+import subprocess_runner
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm  # pip install tqdm
+from media_probe import MediaProbe
+
+
+def _merge_chunk(chunk_size, video_paths, output_path):
+    """
+    Process pool entry point: merge one chunk of the chunk tree.
+    """
+    Concat_vids(chunk_size)._merge_clips(video_paths, output_path, show_progress=False)
+    return output_path
+
 
 class Concat_vids:
 
-    def __init__(self, chunk_size=5):
+    def __init__(self, chunk_size=5, max_workers=None):
         """
         :param chunk_size: Number of videos to concatenate at a time
                            before writing intermediate output. Adjust
                            based on your available RAM and video sizes.
+        :param max_workers: Number of chunk merges run at the same time on each
+                            level of the chunk tree. Defaults to the CPU count.
         """
         self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.probe = MediaProbe(keyframes=False)
 
     def natural_sort_key(self, s):
         """
@@ -31,15 +47,42 @@ class Concat_vids:
         for i in range(0, len(lst), n):
             yield lst[i:i + n]
 
+    def _stream_signature(self, media):
+        """
+        Everything that has to match for clips to be joined without re-encoding.
+        """
+        audio = media['audio'] or {}
+        return (
+            media['codec'], media['width'], media['height'], media['pix_fmt'],
+            round(media['fps'] or 0, 3), media['extradata_hash'],
+            audio.get('codec'), audio.get('sample_rate'), audio.get('channels')
+        )
+
+    def is_homogeneous(self, video_paths):
+        """
+        True if every clip has identical codec parameters (as VideoOps.trim_video
+        produces them), so the concat demuxer can join them with stream copy.
+        """
+        media = self.probe.probe_many(video_paths)
+        if not all(media.values()):
+            return False
+        return len({self._stream_signature(m) for m in media.values()}) == 1
+
     def concatenate_videos_in_chunks(self, video_paths, output_path):
         """
-        Concatenate the given list of video_paths into output_path using chunked approach.
-        Uses a recursive approach to handle large sets of videos.
+        Concatenate the given list of video_paths into output_path.
+        Homogeneous inputs are joined in one stream-copy pass. Otherwise a chunk
+        tree is re-encoded, with every chunk of a level merged in a process pool.
         """
         if not video_paths:
             print("No videos to concatenate.")
             return
 
+        if self.is_homogeneous(video_paths):
+            print(f"All {len(video_paths)} clips share codec parameters, joining with stream copy.")
+            self._merge_clips(video_paths, output_path, copy=True)
+            return
+
         # If the number of videos <= chunk_size, do a direct merge:
         if len(video_paths) <= self.chunk_size:
             self._merge_clips(video_paths, output_path)
@@ -49,27 +92,66 @@ class Concat_vids:
         temp_folder = f"temp_merge_{uuid.uuid4()}"
         os.makedirs(temp_folder, exist_ok=True)
 
-        chunk_files = []
-        total_chunks = ceil(len(video_paths) / self.chunk_size)
-
-        for chunk_index, chunk in enumerate(self._chunkify(video_paths, self.chunk_size), start=1):
-            chunk_output = os.path.join(temp_folder, f"chunk_{chunk_index}.mp4")
-            chunk_files.append(chunk_output)
-            self._merge_clips(chunk, chunk_output)
-
-        # If there's only one intermediate file after chunk-merge, just move it
-        if len(chunk_files) == 1:
-            shutil.move(chunk_files[0], output_path)
-        else:
-            # Merge intermediate chunk files into final output
-            self.concatenate_videos_in_chunks(chunk_files, output_path)
-
-        shutil.rmtree(temp_folder, ignore_errors=True)
+        try:
+            level = 1
+            while len(video_paths) > self.chunk_size:
+                chunks = list(self._chunkify(video_paths, self.chunk_size))
+                chunk_files = [
+                    os.path.join(temp_folder, f"level{level}_chunk_{chunk_index}.mp4")
+                    for chunk_index in range(1, len(chunks) + 1)
+                ]
+                # Every chunk of a level is independent, so the level runs in parallel
+                with ProcessPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+                    futures = [
+                        executor.submit(_merge_chunk, self.chunk_size, chunk, chunk_output)
+                        for chunk, chunk_output in zip(chunks, chunk_files)
+                    ]
+                    with tqdm(total=len(futures), desc=f"Merging level {level}", unit="chunks") as pbar:
+                        for future in futures:
+                            future.result()
+                            pbar.update(1)
+                video_paths = chunk_files
+                level += 1
+
+            # If there's only one intermediate file after chunk-merge, just move it
+            if len(video_paths) == 1:
+                shutil.move(video_paths[0], output_path)
+            else:
+                # Merge intermediate chunk files into final output
+                self._merge_clips(video_paths, output_path)
+        finally:
+            shutil.rmtree(temp_folder, ignore_errors=True)
 
-    def _merge_clips(self, video_paths, output_path):
+    def _run_with_progress(self, cmd, total_seconds, desc, inputs=None):
+        """
+        Run ffmpeg and drive a progress bar from its `-progress` output.
+        """
+        cmd = cmd[:1] + ['-progress', 'pipe:1', '-nostats'] + cmd[1:]
+        # stderr goes to a file: a pipe nobody reads until stdout ends could fill up and
+        # block ffmpeg while we wait on its progress output
+        with tqdm(total=round(total_seconds, 2), desc=desc, unit="s") as pbar, tempfile.TemporaryFile() as stderr_file:
+            process = subprocess_runner.Popen(cmd, stage='concat', inputs=inputs, stdout=subprocess.PIPE,
+                                              stderr=stderr_file, text=True)
+            for line in process.stdout:
+                key, _, value = line.strip().partition('=')
+                # out_time_us (and the misnamed out_time_ms) are in microseconds
+                if key == 'out_time_us' and value.isdigit():
+                    pbar.n = min(round(int(value) / 1e6, 2), pbar.total)
+                    pbar.refresh()
+                elif key == 'progress' and value == 'end':
+                    pbar.n = pbar.total
+                    pbar.refresh()
+            return_code = process.wait()
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', errors='ignore')
+        if return_code != 0:
+            raise subprocess.CalledProcessError(return_code, cmd, stderr=stderr)
+
+    def _merge_clips(self, video_paths, output_path, copy=False, show_progress=True):
         """
         Merge given video_paths at once and write to output_path using ffmpeg.
-        This uses the concat demuxer for precise timing and re-encodes
+        This uses the concat demuxer for precise timing and either stream-copies
+        (copy=True, inputs must share codec parameters) or re-encodes
         using libx264 (veryfast preset) and AAC to ensure consistent output.
         """
         if not video_paths:
@@ -85,32 +167,38 @@ class Concat_vids:
             for vp in video_paths:
                 f.write(f"file '{os.path.abspath(vp)}'\n")
 
-        # We can show a short progress bar for reading each clip's path
-        # even though ffmpeg's internal progress isn't easily trackable
-        with tqdm(total=len(video_paths), desc=f"Merging to {os.path.basename(output_path)}", unit="videos") as pbar:
-            for _ in video_paths:
-                # We won't individually re-encode each file here,
-                # but let's simulate progress for user feedback
-                pbar.update(1)
+        if copy:
+            codec_args = ['-c', 'copy']
+        else:
+            codec_args = [
+                '-c:v', 'libx264',
+                '-preset', 'veryfast',   # Faster encoding preset
+                '-crf', '18',            # Adjust for desired quality (lower=better, bigger files)
+                '-c:a', 'aac'
+            ]
 
         cmd = [
             'ffmpeg',
             '-y',
             '-f', 'concat',
             '-safe', '0',
-            '-i', list_file,
-            '-c:v', 'libx264',
-            '-preset', 'veryfast',   # Faster encoding preset
-            '-crf', '18',            # Adjust for desired quality (lower=better, bigger files)
-            '-c:a', 'aac',
+            '-i', list_file
+        ] + codec_args + [
             '-movflags', '+faststart',
             output_path
         ]
 
         try:
-            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+            if show_progress:
+                media = self.probe.probe_many(video_paths)
+                total_seconds = sum(m['duration'] for m in media.values() if m)
+                self._run_with_progress(cmd, total_seconds, f"Merging to {os.path.basename(output_path)}", video_paths)
+            else:
+                subprocess_runner.run(cmd, stage='concat', inputs=video_paths, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
         except subprocess.CalledProcessError as e:
             print(f"Error during ffmpeg concatenation: {e}")
+            if e.stderr:
+                print(e.stderr[-2000:])
         finally:
             if os.path.exists(list_file):
                 os.remove(list_file)
@@ -0,0 +1,259 @@
+import os
+import json
+import uuid
+import subprocess
+import subprocess_runner
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from media_probe import MediaProbe
+
+class Edl_renderer:
+
+    def __init__(self, preset='veryfast', crf=18, fps=24, threads=None):
+        """
+        :param preset: libx264 preset used for the single track encode.
+        :param crf: libx264 quality (lower=better, bigger files).
+        :param fps: Output frame rate of the rendered track.
+        :param threads: x264 thread budget per render. Defaults to ffmpeg's own choice.
+        """
+        self.preset = preset
+        self.crf = crf
+        self.fps = fps
+        self.threads = threads
+        self.probe = MediaProbe(keyframes=False)
+
+    def load_plan(self, plan_path):
+        """
+        Load an EDL written by Sequencer.save_plan.
+        """
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _ms_to_frame(self, ms):
+        """
+        Convert a time in milliseconds to the nearest frame number at self.fps.
+        """
+        return int(round(ms * self.fps / 1000.0))
+
+    def build_filter_graph(self, entries, input_offset=0, prefix=''):
+        """
+        Build the filter graph for a list of EDL entries.
+
+        Every distinct source file is opened once and split into as many
+        branches as there are entries taken from it, so each source is decoded
+        a single time no matter how often the timeline uses it.
+
+        :param entries: EDL entries (see Sequencer.plan_sequence).
+        :param input_offset: ffmpeg input index of the first source (when other inputs come first).
+        :param prefix: Prefix of every label, so several tracks can share one graph.
+        :return: (list of input paths, filter graph string, output label)
+        """
+        sources = []
+        uses = {}
+        for entry in entries:
+            if entry['source'] not in uses:
+                sources.append(entry['source'])
+                uses[entry['source']] = 0
+            uses[entry['source']] += 1
+
+        filters = []
+        branch_labels = {}
+        for input_index, source in enumerate(sources):
+            count = uses[source]
+            labels = [f"{prefix}s{input_index}_{n}" for n in range(count)]
+            branch_labels[source] = labels
+            if count == 1:
+                filters.append(f"[{input_offset + input_index}:v:0]null[{labels[0]}]")
+            else:
+                filters.append(f"[{input_offset + input_index}:v:0]split={count}"
+                               + ''.join(f"[{label}]" for label in labels))
+
+        taken = {source: 0 for source in sources}
+        segment_labels = []
+        for n, entry in enumerate(entries):
+            source = entry['source']
+            label = branch_labels[source][taken[source]]
+            taken[source] += 1
+            # Cut on frame numbers derived from the timeline position so rounding
+            # never accumulates across hundreds of entries
+            start_frame = self._ms_to_frame(entry['start_ms'])
+            frame_count = (self._ms_to_frame(entry['at_ms'] + entry['end_ms'] - entry['start_ms'])
+                           - self._ms_to_frame(entry['at_ms']))
+            filters.append(
+                f"[{label}]fps={self.fps},trim=start_frame={start_frame}:end_frame={start_frame + frame_count},"
+                f"setpts=PTS-STARTPTS[{prefix}v{n}]"
+            )
+            segment_labels.append(f"[{prefix}v{n}]")
+
+        filters.append(''.join(segment_labels) + f"concat=n={len(entries)}:v=1:a=0[{prefix}outv]")
+        return sources, ';\n'.join(filters), f"[{prefix}outv]"
+
+    def render_track(self, plan, output_path):
+        """
+        Render one role track from its EDL with a single ffmpeg invocation
+        (one decode per distinct source, one encode for the whole track).
+
+        :param plan: EDL dictionary or path to an EDL JSON file.
+        :param output_path: Path of the rendered track (e.g. test/male.mp4).
+        """
+        if isinstance(plan, str):
+            plan = self.load_plan(plan)
+
+        entries = plan['entries']
+        if not entries:
+            print(f"[Render] No entries in the {plan.get('role')} plan. Skipping...")
+            return
+
+        sources, filter_graph, output_label = self.build_filter_graph(entries)
+
+        print(f"[Render] {len(entries)} entries from {len(sources)} sources -> {output_path}")
+        input_args = []
+        for source in sources:
+            input_args += ['-i', source]
+        if self._run_graph(sources, input_args, filter_graph, ['-map', output_label, '-an'], output_path):
+            print(f"[Render] Rendered {plan.get('role')} track ({plan.get('duration_ms')} ms) -> {output_path}")
+
+    def _run_graph(self, sources, input_args, filter_graph, output_args, output_path):
+        """
+        Run one ffmpeg encode of a filter graph.
+
+        :param sources: Video sources that must exist before starting.
+        :param input_args: ffmpeg input arguments ('-i' ...).
+        :param filter_graph: Filter graph string.
+        :param output_args: Mapping and stream options placed before the encode settings.
+        :param output_path: Path of the encoded file.
+        :return: True on success.
+        """
+        for source in set(sources):
+            if not os.path.isfile(source):
+                raise FileNotFoundError(f"The input video file '{source}' does not exist.")
+
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+
+        # The graph grows with the timeline, so pass it as a script file
+        # instead of a (possibly huge) command line argument
+        script_file = os.path.join(output_dir, f"filter_graph_{uuid.uuid4()}.txt")
+        with open(script_file, 'w', encoding='utf-8') as f:
+            f.write(filter_graph)
+
+        cmd = ['ffmpeg', '-y'] + input_args + ['-filter_complex_script', script_file] + output_args + [
+            '-c:v', 'libx264',
+            '-preset', self.preset,
+            '-crf', str(self.crf),
+            '-r', str(self.fps),
+            '-movflags', '+faststart'
+        ]
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        cmd.append(output_path)
+
+        try:
+            subprocess_runner.run(cmd, stage='render', check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            return True
+        except subprocess.CalledProcessError as e:
+            print("[Render] Error during rendering:")
+            print(e.stderr.decode('utf-8', errors='ignore'))
+            return False
+        finally:
+            if os.path.exists(script_file):
+                os.remove(script_file)
+
+    def render_tracks(self, plans, output_folder='test', parallel=True):
+        """
+        Render every plan to `{output_folder}/{role}.mp4`, the same files
+        Concat_vids.concat_vids produces from the per-clip trims.
+
+        :param parallel: Render all tracks at the same time (one ffmpeg each).
+        """
+        jobs = [(plan, os.path.join(output_folder, f"{plan['role']}.mp4")) for plan in plans]
+        if not parallel or len(jobs) < 2:
+            for plan, output_path in jobs:
+                self.render_track(plan, output_path)
+            return
+
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            list(executor.map(lambda job: self.render_track(*job), jobs))
+
+    def render_split_screen(self, female_plan, male_plan, output_path, audio_path=None, audio_start_time=0):
+        """
+        Render the final split-screen video straight from the two plans in one ffmpeg
+        invocation and a single encode: trim + concat of both tracks, crop of the left
+        half of the female track and the right half of the male track, hstack and the
+        episode audio, all in one filter graph.
+
+        :param female_plan: Female EDL dictionary or path to an EDL JSON file.
+        :param male_plan: Male EDL dictionary or path to an EDL JSON file.
+        :param output_path: Path of the final video.
+        :param audio_path: Episode audio (e.g. audio/name_modified.wav). Video only if None.
+        :param audio_start_time: Time (in seconds) into the audio where the video starts.
+        :return: True on success.
+        """
+        if isinstance(female_plan, str):
+            female_plan = self.load_plan(female_plan)
+        if isinstance(male_plan, str):
+            male_plan = self.load_plan(male_plan)
+
+        if not female_plan['entries'] or not male_plan['entries']:
+            print("[Render] Both plans need entries to render the split screen. Skipping...")
+            return False
+
+        female_sources, female_graph, female_label = self.build_filter_graph(
+            female_plan['entries'], prefix='f')
+        male_sources, male_graph, male_label = self.build_filter_graph(
+            male_plan['entries'], input_offset=len(female_sources), prefix='m')
+        sources = female_sources + male_sources
+
+        # Same checks Combine_vids.crop_and_join_videos does on the rendered tracks
+        media = self.probe.probe_many([female_sources[0], male_sources[0]])
+        if not all(media.values()):
+            raise ValueError("Unable to read the resolution of the animation clips.")
+        if media[female_sources[0]]['height'] != media[male_sources[0]]['height']:
+            raise ValueError("Both videos must have the same height. Please resize them to match.")
+
+        filter_graph = ';\n'.join([
+            female_graph,
+            male_graph,
+            f"{female_label}crop=iw/2:ih:0:0[left]",
+            f"{male_label}crop=iw/2:ih:iw/2:0[right]",
+            "[left][right]hstack=inputs=2[outv]"
+        ])
+
+        input_args = []
+        for source in sources:
+            input_args += ['-i', source]
+        output_args = ['-map', '[outv]']
+        if audio_path:
+            if audio_start_time > 0:
+                input_args += ['-ss', str(audio_start_time)]
+            input_args += ['-i', str(audio_path)]
+            output_args += ['-map', f'{len(sources)}:a:0', '-c:a', 'aac', '-shortest']
+        else:
+            output_args += ['-an']
+
+        print(f"[Render] Split screen from {len(female_plan['entries'])} female and "
+              f"{len(male_plan['entries'])} male entries -> {output_path}")
+        ok = self._run_graph(sources, input_args, filter_graph, output_args, output_path)
+        if ok:
+            print(f"[Render] Successfully saved the split screen video to {output_path}")
+        return ok
+
+    def render_episode(self, female_plan, male_plan, audio_folder='audio', output_folder='output',
+                       audio_extension='.wav', audio_start_time=0):
+        """
+        Render `{output_folder}/<name>_modified_output.mp4` for the single '_modified'
+        audio file in audio_folder, the same file Audio_mixer.mix_audio writes.
+
+        :return: Path of the rendered video or None if nothing was rendered.
+        """
+        modified_audio_files = sorted(Path(audio_folder).glob(f'*_modified{audio_extension}'))
+        if len(modified_audio_files) != 1:
+            print(f"[Render] Expected exactly one '_modified{audio_extension}' audio file in "
+                  f"'{audio_folder}', found {len(modified_audio_files)}.")
+            return None
+
+        audio_path = modified_audio_files[0]
+        output_path = os.path.join(output_folder, f"{audio_path.stem}_output.mp4")
+        if self.render_split_screen(female_plan, male_plan, output_path, audio_path, audio_start_time):
+            return output_path
+        return None
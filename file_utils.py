@@ -0,0 +1,33 @@
+import os
+import json
+import hashlib
+import tempfile
+
+def file_hash(path, block_size=1 << 20):
+    """
+    SHA-1 of the file content, read in blocks.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_json_atomic(data, path, indent=1):
+    """
+    Write JSON atomically: to a uniquely named temp file next to path, then renamed over
+    it, so readers never see a partial file and concurrent writers never share a temp file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        # mkstemp creates the file private to the owner; keep the usual mode of the outputs
+        os.chmod(temp_path, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, sort_keys=True)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
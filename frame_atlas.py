@@ -0,0 +1,203 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import subprocess
+import subprocess_runner
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from media_probe import MediaProbe
+from file_utils import write_json_atomic
+
+class FrameAtlas:
+    # Bump whenever the layout of the frame files changes, so older atlases are rebuilt
+    ATLAS_VERSION = 1
+    INDEX_FILENAME = 'index.json'
+
+    def __init__(self, atlas_dir='.frame_atlas', fps=24, max_workers=None):
+        """
+        Decoded frames of the animation library, stored once on disk as raw rgb24 files.
+
+        Every source is decoded a single time (at fps) into `{atlas_dir}/<key>.rgb`;
+        index.json records the frame count and size of every source. Renderers open the
+        frames with numpy.memmap, so concurrent renders on the machine share one physical
+        copy through the page cache and composing a timeline is plain frame indexing.
+
+        :param atlas_dir: Folder holding the frame files and their index.
+        :param fps: Frame rate the sources are decoded at (the render frame rate).
+        :param max_workers: Number of concurrent ffmpeg decodes while building.
+        """
+        self.atlas_dir = atlas_dir
+        self.fps = fps
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.probe = MediaProbe(keyframes=False)
+        self._frames = {}
+        self._lock = threading.Lock()
+        self.index = self._load_index()
+
+    def _index_path(self):
+        return os.path.join(self.atlas_dir, self.INDEX_FILENAME)
+
+    def _load_index(self):
+        index = {'version': self.ATLAS_VERSION, 'fps': self.fps, 'sources': {}}
+        if not os.path.isfile(self._index_path()):
+            return index
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable frame atlas index '{self._index_path()}': {e}")
+            return index
+        if loaded.get('version') != self.ATLAS_VERSION or loaded.get('fps') != self.fps:
+            return index
+        return loaded
+
+    def _save_index(self):
+        """
+        Write the index atomically (via a temp file).
+        """
+        write_json_atomic(self.index, self._index_path())
+
+    def _source_key(self, path):
+        return os.path.abspath(path)
+
+    def _is_current(self, path):
+        """
+        True if the source is in the atlas and has not changed since it was decoded.
+        """
+        entry = self.index['sources'].get(self._source_key(path))
+        if not entry or not os.path.isfile(os.path.join(self.atlas_dir, entry['file'])):
+            return False
+        stat = os.stat(path)
+        return entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+
+    def _decode(self, path, media):
+        """
+        Decode one source into its frame file.
+
+        :return: Index entry or None if failed.
+        """
+        key = self._source_key(path)
+        filename = f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.rgb"
+        frame_path = os.path.join(self.atlas_dir, filename)
+        # Unique across processes, so concurrent builds never decode into the same file
+        fd, temp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix='.tmp', dir=self.atlas_dir)
+        os.close(fd)
+        stat = os.stat(path)
+
+        cmd = [
+            'ffmpeg', '-y', '-v', 'error',
+            '-i', path,
+            '-map', '0:v:0',
+            '-vf', f"fps={self.fps}",
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgb24',
+            temp_path
+        ]
+        try:
+            subprocess_runner.run(cmd, stage='atlas', check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            frame_bytes = media['width'] * media['height'] * 3
+            frame_count = os.path.getsize(temp_path) // frame_bytes
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, frame_path)
+        except subprocess.CalledProcessError as e:
+            print(f"[Atlas] Error while decoding '{path}':")
+            print(e.stderr.decode('utf-8', errors='ignore'))
+            return None
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return {
+            'file': filename,
+            'frame_count': frame_count,
+            'width': media['width'],
+            'height': media['height'],
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns
+        }
+
+    def build(self, paths):
+        """
+        Decode every source that is not in the atlas yet (or changed since) and
+        update the index. Unchanged sources are skipped.
+
+        :param paths: Iterable of source video paths.
+        :return: Number of decoded sources.
+        """
+        paths = list(dict.fromkeys(paths))
+        stale = [path for path in paths if not self._is_current(path)]
+        if not stale:
+            print(f"[Atlas] All {len(paths)} sources are up to date.")
+            return 0
+
+        media = self.probe.probe_many(stale)
+        jobs = [path for path in stale if media[path] and media[path]['width']]
+        for path in stale:
+            if path not in jobs:
+                print(f"[Atlas] Skipping '{path}': no readable video stream")
+
+        os.makedirs(self.atlas_dir, exist_ok=True)
+        print(f"[Atlas] Decoding {len(jobs)} sources into '{self.atlas_dir}'...")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            entries = list(executor.map(lambda path: self._decode(path, media[path]), jobs))
+
+        decoded = 0
+        for path, entry in zip(jobs, entries):
+            if entry:
+                self.index['sources'][self._source_key(path)] = entry
+                self._frames.pop(self._source_key(path), None)
+                decoded += 1
+        self._save_index()
+        print(f"[Atlas] Decoded {decoded} sources.")
+        return decoded
+
+    def build_from_animations(self, animations_dict):
+        """
+        Build the atlas for every clip of ScanPath.scan_animations_directory_with_duration_ms.
+        """
+        return self.build(
+            path
+            for role in animations_dict.values()
+            for animation in role.values()
+            for path in animation['paths']
+        )
+
+    def frames(self, path):
+        """
+        Read-only memory map of all the frames of a source.
+
+        :return: uint8 array of shape (frame_count, height, width, 3).
+        """
+        key = self._source_key(path)
+        with self._lock:
+            if key not in self._frames:
+                entry = self.index['sources'].get(key)
+                if not entry:
+                    raise KeyError(f"'{path}' is not in the frame atlas. Build the atlas first.")
+                self._frames[key] = np.memmap(
+                    os.path.join(self.atlas_dir, entry['file']),
+                    dtype=np.uint8,
+                    mode='r',
+                    shape=(entry['frame_count'], entry['height'], entry['width'], 3)
+                )
+            return self._frames[key]
+
+    def frame_count(self, path):
+        return self.index['sources'][self._source_key(path)]['frame_count']
+
+    def frame(self, path, index):
+        """
+        One frame of a source; indexes past the end repeat the last frame.
+        """
+        frames = self.frames(path)
+        return frames[min(index, len(frames) - 1)]
+
+
+if __name__ == "__main__":
+    from scan_path import ScanPath
+
+    animations_folder = "animations"
+    atlas = FrameAtlas()
+    atlas.build_from_animations(ScanPath().scan_animations_directory_with_duration_ms(animations_folder))
+    print("[Atlas] Frame atlas ready in:", atlas.atlas_dir)
@@ -0,0 +1,189 @@
+import os
+import queue
+import tempfile
+import threading
+import subprocess
+import subprocess_runner
+import numpy as np
+from edl_renderer import Edl_renderer
+from frame_atlas import FrameAtlas
+
+class FrameCompositor(Edl_renderer):
+
+    def __init__(self, atlas=None, preset='veryfast', crf=18, fps=24, threads=None, buffers=2):
+        """
+        Split-screen renderer working on decoded frames instead of an ffmpeg filter graph.
+
+        Every output frame is assembled in NumPy from the frame atlas: the left half of
+        the female frame and the right half of the male frame are copied (from zero-copy
+        memmap views) into a preallocated output buffer, which is streamed as raw video
+        to a single ffmpeg encoder that also muxes the episode audio. A writer thread
+        feeds the encoder while the next buffer is being filled, so assembly and encoding
+        overlap.
+
+        :param atlas: FrameAtlas to read the frames from. Defaults to one at this fps.
+        :param buffers: Number of output buffers cycling between assembly and encoding.
+        """
+        super().__init__(preset=preset, crf=crf, fps=fps, threads=threads)
+        self.atlas = atlas or FrameAtlas(fps=fps)
+        self.buffers = max(2, buffers)
+
+    def _frame_map(self, entries):
+        """
+        Source and source frame of every output frame of a track, cut on the same frame
+        numbers as Edl_renderer.build_filter_graph.
+
+        :return: (list of sources, source index per frame, source frame per frame)
+        """
+        sources = list(dict.fromkeys(entry['source'] for entry in entries))
+        source_index = {source: i for i, source in enumerate(sources)}
+
+        counts = np.asarray([
+            self._ms_to_frame(entry['at_ms'] + entry['end_ms'] - entry['start_ms'])
+            - self._ms_to_frame(entry['at_ms'])
+            for entry in entries
+        ], dtype=np.int64).clip(min=0)
+        start_frames = np.asarray([self._ms_to_frame(entry['start_ms']) for entry in entries], dtype=np.int64)
+        entry_sources = np.asarray([source_index[entry['source']] for entry in entries], dtype=np.int64)
+        offsets = np.cumsum(counts) - counts
+
+        source_ids = np.repeat(entry_sources, counts)
+        source_frames = np.repeat(start_frames - offsets, counts) + np.arange(counts.sum())
+        # A cut running past the end of its clip holds the last frame
+        frame_counts = np.asarray([self.atlas.frame_count(source) for source in sources], dtype=np.int64)
+        source_frames = np.minimum(source_frames, frame_counts[source_ids] - 1)
+        return sources, source_ids, source_frames
+
+    def _track_frames(self, sources):
+        """
+        Memmaps of the sources of a track, checking they all share one size.
+        """
+        frames = [self.atlas.frames(source) for source in sources]
+        shapes = {f.shape[1:] for f in frames}
+        if len(shapes) != 1:
+            raise ValueError(f"All clips of a track must have the same size, found {sorted(shapes)}.")
+        return frames
+
+    def render_split_screen(self, female_plan, male_plan, output_path, audio_path=None, audio_start_time=0):
+        """
+        Same output as Edl_renderer.render_split_screen, assembled frame by frame from
+        the atlas and encoded once.
+
+        :return: True on success.
+        """
+        if isinstance(female_plan, str):
+            female_plan = self.load_plan(female_plan)
+        if isinstance(male_plan, str):
+            male_plan = self.load_plan(male_plan)
+
+        if not female_plan['entries'] or not male_plan['entries']:
+            print("[Render] Both plans need entries to render the split screen. Skipping...")
+            return False
+
+        self.atlas.build(entry['source'] for plan in (female_plan, male_plan) for entry in plan['entries'])
+
+        female_sources, female_ids, female_indexes = self._frame_map(female_plan['entries'])
+        male_sources, male_ids, male_indexes = self._frame_map(male_plan['entries'])
+        female_frames = self._track_frames(female_sources)
+        male_frames = self._track_frames(male_sources)
+
+        height, female_width, _ = female_frames[0].shape[1:]
+        male_height, male_width, _ = male_frames[0].shape[1:]
+        if height != male_height:
+            raise ValueError("Both videos must have the same height. Please resize them to match.")
+
+        # crop=iw/2:ih:0:0 of the female track and crop=iw/2:ih:iw/2:0 of the male track
+        left_width = female_width // 2
+        right_width = male_width // 2
+        width = left_width + right_width
+        frame_total = max(len(female_ids), len(male_ids))
+
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+
+        cmd = [
+            'ffmpeg', '-y',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgb24',
+            '-s', f"{width}x{height}",
+            '-r', str(self.fps),
+            '-i', 'pipe:0'
+        ]
+        output_args = ['-map', '0:v:0']
+        if audio_path:
+            if audio_start_time > 0:
+                cmd += ['-ss', str(audio_start_time)]
+            cmd += ['-i', str(audio_path)]
+            output_args += ['-map', '1:a:0', '-c:a', 'aac', '-shortest']
+        else:
+            output_args += ['-an']
+        cmd += output_args + [
+            '-c:v', 'libx264',
+            '-preset', self.preset,
+            '-crf', str(self.crf),
+            '-pix_fmt', 'yuv420p',
+            '-movflags', '+faststart'
+        ]
+        if self.threads:
+            cmd += ['-threads', str(self.threads)]
+        cmd.append(output_path)
+
+        print(f"[Render] Compositing {frame_total} frames ({width}x{height}) from "
+              f"{len(female_sources) + len(male_sources)} atlas clips -> {output_path}")
+
+        free_buffers = queue.Queue()
+        filled_buffers = queue.Queue()
+        for _ in range(self.buffers):
+            free_buffers.put(np.empty((height, width, 3), dtype=np.uint8))
+        write_errors = []
+
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess_runner.Popen(cmd, stage='composite', stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                             stderr=stderr_file)
+
+            def write_frames():
+                while True:
+                    buffer = filled_buffers.get()
+                    if buffer is None:
+                        break
+                    if not write_errors:
+                        try:
+                            process.stdin.write(buffer)
+                        except (BrokenPipeError, OSError) as e:
+                            write_errors.append(e)
+                    free_buffers.put(buffer)
+
+            writer = threading.Thread(target=write_frames, daemon=True)
+            writer.start()
+            try:
+                last_female = len(female_ids) - 1
+                last_male = len(male_ids) - 1
+                for n in range(frame_total):
+                    if write_errors:
+                        break
+                    buffer = free_buffers.get()
+                    # The shorter track holds its last frame, like hstack does
+                    f = min(n, last_female)
+                    m = min(n, last_male)
+                    np.copyto(buffer[:, :left_width],
+                              female_frames[female_ids[f]][female_indexes[f], :, :left_width])
+                    np.copyto(buffer[:, left_width:],
+                              male_frames[male_ids[m]][male_indexes[m], :, right_width:2 * right_width])
+                    filled_buffers.put(buffer)
+            finally:
+                filled_buffers.put(None)
+                writer.join()
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+                process.wait()
+
+            if process.returncode != 0 or write_errors:
+                stderr_file.seek(0)
+                print("[Render] Error during rendering:")
+                print(stderr_file.read().decode('utf-8', errors='ignore'))
+                return False
+
+        print(f"[Render] Successfully saved the split screen video to {output_path}")
+        return True
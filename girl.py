@@ -1,40 +1,16 @@
 import os
 import random
-from moviepy.editor import VideoFileClip, concatenate_videoclips
+from media_probe import MediaProbe
+from clip_pool import ClipPool, add_range
+from transcript_parser import load_transcript
 
-def parse_timestamp(ts_str):
-    h, m, s, ms = ts_str.strip().split(':')
-    total_seconds = int(h) * 3600 + int(m) * 60 + int(s) + float(ms) / 1000.0
-    return total_seconds
+probe = MediaProbe(keyframes=False)
 
 def parse_transcript(filename, total_duration):
-    segments = []
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        if line.startswith('SPEAKER'):
-            parts = line.split()
-            speaker = parts[0] + ' ' + parts[1]
-            timestamp = parts[2]
-            start_time = parse_timestamp(timestamp)
-            i += 1
-            text = ''
-            while i < len(lines) and not lines[i].startswith('SPEAKER'):
-                text += lines[i]
-                i += 1
-            segments.append({'speaker': speaker, 'start_time': start_time, 'text': text})
-        else:
-            i += 1
-
-    for j in range(len(segments) - 1):
-        segments[j]['end_time'] = segments[j + 1]['start_time']
-    if segments:
-        segments[-1]['end_time'] = total_duration
-
-    return segments
+    """
+    Speaker segments with start / end times in seconds; the last one ends at total_duration.
+    """
+    return load_transcript(filename).to_segments('SPEAKER', last_end=total_duration, seconds=True)
 
 def determine_category(dirpath, filename):
     lower_path = dirpath.lower()
@@ -49,7 +25,7 @@ def determine_category(dirpath, filename):
         return 'fill'
 
 def get_animations(root_dir):
-    animations = []
+    pairs = []
     for dirpath, _, filenames in os.walk(root_dir):
         with_lip_videos = [f for f in filenames if f.endswith('_with_lip_move.mp4')]
         for wl_file in with_lip_videos:
@@ -61,40 +37,28 @@ def get_animations(root_dir):
             if without_lip_file in filenames:
                 with_lip_path = os.path.join(dirpath, wl_file)
                 without_lip_path = os.path.join(dirpath, without_lip_file)
+                pairs.append((dirpath, wl_file, with_lip_path, without_lip_path))
 
-                try:
-                    with_lip_clip = VideoFileClip(with_lip_path)
-                except Exception as e:
-                    print(f"[WARNING] Could not load '{with_lip_path}': {e}")
-                    continue
-
-                try:
-                    without_lip_clip = VideoFileClip(without_lip_path)
-                except Exception as e:
-                    print(f"[WARNING] Could not load '{without_lip_path}': {e}")
-                    with_lip_clip.close()
-                    continue
-
-                # Attempt to read at least one frame from each clip to verify integrity
-                try:
-                    # Read first frame from with_lip_clip
-                    next(with_lip_clip.iter_frames())
-                    # Read first frame from without_lip_clip
-                    next(without_lip_clip.iter_frames())
-                except Exception as e:
-                    print(f"[WARNING] One of the clips '{with_lip_path}' or '{without_lip_path}' failed to read a frame: {e}")
-                    with_lip_clip.close()
-                    without_lip_clip.close()
-                    continue
-
-                anim_duration = with_lip_clip.duration
-                category = determine_category(dirpath, wl_file)
-                animations.append({
-                    'with_lip_move': with_lip_clip,
-                    'without_lip_move': without_lip_clip,
-                    'duration': anim_duration,
-                    'category': category
-                })
+    # Probe the whole library in one batch instead of opening a decoder per clip;
+    # the clips themselves are opened on first use while rendering
+    media = probe.probe_many([path for pair in pairs for path in pair[2:]])
+
+    animations = []
+    for dirpath, wl_file, with_lip_path, without_lip_path in pairs:
+        # A clip without any video frame would fail later in the render
+        invalid = [path for path in (with_lip_path, without_lip_path)
+                   if not media[path] or not media[path]['frame_count']]
+        if invalid:
+            print(f"[WARNING] Could not load '{invalid[0]}': no readable video stream")
+            continue
+
+        category = determine_category(dirpath, wl_file)
+        animations.append({
+            'with_lip_move': with_lip_path,
+            'without_lip_move': without_lip_path,
+            'duration': media[with_lip_path]['duration'],
+            'category': category
+        })
     return animations
 
 def print_progress_bar(current, total, length=30):
@@ -103,7 +67,7 @@ def print_progress_bar(current, total, length=30):
     return f"[{bar}] {current:.2f}/{total:.2f}s"
 
 def run_girl(total_duration, transcript_path, animation_path,
-             nod_prob, yes_long_prob, fill_prob):
+             nod_prob, yes_long_prob, fill_prob, max_readers=8):
     print("============================================================")
     print("                  VIDEO CREATION TOOL                      ")
     print("============================================================")
@@ -138,13 +102,18 @@ def run_girl(total_duration, transcript_path, animation_path,
             weights.append(w)
         return random.choices(animations, weights=weights, k=1)[0]
 
+    # Each source file is opened once, the first time the timeline needs it, and at
+    # most max_readers ffmpeg readers run at a time
+    clip_pool = ClipPool(max_readers=max_readers)
+
     print("[INFO] Building the video timeline...")
     current_time = 0.0
     current_animation = pick_animation()  # initial animation
     current_animation_position = 0.0
     current_segment_index = 0
     current_speaker = segments[current_segment_index]['speaker'] if segments else 'SPEAKER 1'
-    video_clips = []
+    # Contiguous ranges of the same source are merged into one subclip
+    timeline = []
 
     while current_time < total_duration:
         # Next speaker change time
@@ -164,17 +133,16 @@ def run_girl(total_duration, transcript_path, animation_path,
 
         # If SPEAKER 1 is talking, use with_lip_move; otherwise without_lip_move
         if current_speaker == 'SPEAKER 1':
-            source_clip = current_animation['with_lip_move']
+            source_path = current_animation['with_lip_move']
             clip_type = "_with_lip_move"
         else:
-            source_clip = current_animation['without_lip_move']
+            source_path = current_animation['without_lip_move']
             clip_type = "_without_lip_move"
 
         print(f"[CLIP] Adding from {current_time:.2f}s to {next_event_time:.2f}s "
               f"({duration:.2f}s) [{current_animation['category']}{clip_type}]")
 
-        clip = source_clip.subclip(current_animation_position, current_animation_position + duration)
-        video_clips.append(clip)
+        add_range(timeline, source_path, current_animation_position, current_animation_position + duration)
 
         # Update timeline
         current_time = next_event_time
@@ -208,16 +176,17 @@ def run_girl(total_duration, transcript_path, animation_path,
             print(f"[PROGRESS] {progress}")
 
     print("------------------------------------------------------------")
-    print("[INFO] Concatenating video clips...")
-    final_clip = concatenate_videoclips(video_clips, method="compose")
+    print(f"[INFO] Concatenating {len(timeline)} video clips...")
+    final_clip = clip_pool.concatenate(timeline)
 
     print("[INFO] Rendering final video...")
     final_clip.write_videofile('girl.mp4', codec='libx264', audio_codec='aac')
 
+    pool_stats = clip_pool.stats()
+    print(f"[INFO] Clip pool: {pool_stats['sources']} sources, {pool_stats['evictions']} reader evictions")
+
     # Close all loaded clips
-    for anim in animations:
-        anim['with_lip_move'].close()
-        anim['without_lip_move'].close()
+    clip_pool.close()
 
     print("============================================================")
     print("          PROCESS COMPLETED SUCCESSFULLY!                   ")
@@ -1,46 +1,19 @@
 import os
 import random
 from moviepy.editor import VideoFileClip, concatenate_videoclips
+from media_probe import MediaProbe
+from transcript_parser import load_transcript
 
-def parse_timestamp(ts_str):
-    h, m, s, ms = ts_str.strip().split(':')
-    total_seconds = int(h) * 3600 + int(m) * 60 + int(s) + float(ms) / 1000.0
-    return total_seconds
+probe = MediaProbe(keyframes=False)
 
 def parse_transcript(filename, total_duration):
-    segments = []
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        if line.startswith('SPEAKER'):
-            parts = line.split()
-            speaker = parts[0] + ' ' + parts[1]
-            timestamp = parts[2]
-            start_time = parse_timestamp(timestamp)
-            i += 1
-            text = ''
-            while i < len(lines) and not lines[i].startswith('SPEAKER'):
-                text += lines[i]
-                i += 1
-            segments.append({'speaker': speaker, 'start_time': start_time, 'text': text})
-        else:
-            i += 1
-
-    # Set end times
-    for j in range(len(segments)-1):
-        segments[j]['end_time'] = segments[j+1]['start_time']
-    if segments:
-        segments[-1]['end_time'] = total_duration
-    return segments
+    """
+    Speaker segments with start / end times in seconds; the last one ends at total_duration.
+    """
+    return load_transcript(filename).to_segments('SPEAKER', last_end=total_duration, seconds=True)
 
 def get_duration(video_path):
-    clip = VideoFileClip(video_path)
-    duration = clip.duration
-    clip.close()
-    return duration
+    return probe.get_duration(video_path)
 
 def get_animations(root_dir):
     animations = []
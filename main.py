@@ -1,48 +1,253 @@
-from sequencer import Sequencer
-from concat_videos import Concat_vids
-from combine import Combine_vids
-from audio_mixer import Audio_mixer
-from generate_title_desc import Generate_title
-from youtube_upload import YouTubeUploader
-from parser import Time_parser
-from audio_mod import Audio_mod
+from pipeline import Pipeline, Stage, ArtifactStore
+import subprocess_runner
+import profiling
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import glob
+import json
+import os
 import sys
 
+# The stage modules are imported inside the stages, so a run where everything is
+# up to date does not pay for loading moviepy, pydub or the Google clients
+
 # total_time = Time_parser().get_total_seconds_from_transcript() * 1000
 
 # print('\ntotal_time\n', total_time)
 
 
 
-sequencer = Sequencer(True, 5)
-sequencer.create_sequence('female')
+# How the video is rendered:
+#   'single_pass' - plan both tracks in memory and render trim, concat, crop, hstack
+#                   and the episode audio with one ffmpeg encode
+#   'compositor'  - plan both tracks and assemble every frame from the decoded frame
+#                   atlas in NumPy, piped to one ffmpeg encode with the episode audio
+#   'tracks'      - plan both tracks and render each one with a single ffmpeg call,
+#                   then combine and mix
+#   'segments'    - plan both tracks on the grid of the pre-cut segment library and
+#                   assemble each one by stream copy, then combine and mix
+#   'trims'       - trim every clip into test/{role}, concat, combine and mix
+RENDER_MODE = 'single_pass'
+RENDER_MODES = ('single_pass', 'compositor', 'tracks', 'segments', 'trims')
+
+# Worker budget for the sequencing stage, shared by the two role tracks
+SEQUENCE_WORKERS = os.cpu_count() or 1
+
+# Disk quota of the artifact store holding the outputs of earlier runs
+ARTIFACT_QUOTA_GB = 10
+
+# Trace of every ffmpeg/ffprobe call of a run (open it in chrome://tracing or ui.perfetto.dev)
+TRACE_FILE = '.trace/subprocess_trace.json'
+
+TRANSCRIPT = 'transcript/transcript.txt'
+PLANS = {'female': 'plans/female.json', 'male': 'plans/male.json'}
+TRACKS = {'female': 'test/female.mp4', 'male': 'test/male.mp4'}
+COMBINED_VIDEO = 'combined_video/combined_video.mp4'
+TITLE_FILE = 'output/title.json'
+AUDIO_SUFFIX = '_modified'
+AUDIO_PARAMS = {'gap_ms': 200, 'interval_ms': 60000}
+
+def animation_files():
+    return sorted(path for path in glob.glob('animations/**/*.mp4', recursive=True))
+
+def source_audio_files():
+    return sorted(path for path in glob.glob('audio/*.wav')
+                  if not path.lower().endswith(f"{AUDIO_SUFFIX}.wav"))
+
+def modified_audio_files():
+    return [f"{os.path.splitext(path)[0]}{AUDIO_SUFFIX}.wav" for path in source_audio_files()]
+
+def episode_files():
+    # Same name Audio_mixer.mix_audio and Edl_renderer.render_episode write
+    return [os.path.join('output', f"{Path(path).stem}_output.mp4") for path in modified_audio_files()]
+
+def single_modified_audio():
+    audio_files = modified_audio_files()
+    if len(audio_files) != 1:
+        print(f"[Error] Expected exactly one '{AUDIO_SUFFIX}.wav' audio file in 'audio', found {len(audio_files)}.")
+        return None
+    return audio_files[0]
+
+def build_stages(mode, jobs):
+    """
+    The episode pipeline for a render mode.
+
+    :param mode: One of RENDER_MODES.
+    :param jobs: Worker budget of the stages.
+    :return: List of Stage.
+    """
+    def run_audio():
+        from audio_mod import Audio_mod
+        Audio_mod().process_audio_files(output_suffix=AUDIO_SUFFIX, max_workers=jobs, **AUDIO_PARAMS)
+
+    def load_plans():
+        from edl_renderer import Edl_renderer
+        renderer = Edl_renderer()
+        return renderer.load_plan(PLANS['female']), renderer.load_plan(PLANS['male'])
+
+    def run_plan():
+        from sequencer import Sequencer
+        segment_library = None
+        if mode == 'segments':
+            from segment_library import SegmentLibrary
+            from scan_path import ScanPath
+            segment_library = SegmentLibrary()
+            segment_library.build_from_animations(ScanPath().scan_animations_directory_with_duration_ms('animations'))
+        for is_speaker1_man, role in ((True, 'female'), (False, 'male')):
+            sequencer = Sequencer(is_speaker1_man, 5, segment_library=segment_library)
+            sequencer.save_plan(sequencer.plan_sequence(role), PLANS[role])
+
+    def run_render():
+        from edl_renderer import Edl_renderer
+        from frame_compositor import FrameCompositor
+        female_plan, male_plan = load_plans()
+        renderer = FrameCompositor if mode == 'compositor' else Edl_renderer
+        return renderer(threads=jobs).render_episode(female_plan, male_plan) is not None
+
+    def run_tracks():
+        from edl_renderer import Edl_renderer
+        female_plan, male_plan = load_plans()
+        if mode == 'segments':
+            from segment_library import SegmentLibrary
+            segment_library = SegmentLibrary()
+            for plan in (female_plan, male_plan):
+                # Entries off the segment grid need a regular encode of the track
+                if not segment_library.assemble_track(plan, TRACKS[plan['role']]):
+                    Edl_renderer(threads=jobs).render_track(plan, TRACKS[plan['role']])
+        else:
+            Edl_renderer(threads=max(1, jobs // 2)).render_tracks([female_plan, male_plan])
+
+    def run_trims():
+        from sequencer import Sequencer
+        from concat_videos import Concat_vids
+        sequencer = Sequencer(True, 5)
+        sequencer2 = Sequencer(False, 5)
+
+        # Sequence both role tracks at the same time, each with half of the workers
+        role_workers = max(1, jobs // 2)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            female = executor.submit(sequencer.create_sequence, 'female', role_workers, 1)
+            male = executor.submit(sequencer2.create_sequence, 'male', role_workers, 1)
+            female.result()
+            male.result()
+
+        Concat_vids().concat_vids()
+
+    def run_combine():
+        from combine import Combine_vids
+        os.makedirs(os.path.dirname(COMBINED_VIDEO), exist_ok=True)
+        Combine_vids().run_combine()
+
+    def run_mix():
+        from audio_mixer import Audio_mixer
+        audio_path = single_modified_audio()
+        if not audio_path:
+            return False
+        os.makedirs('output', exist_ok=True)
+        Audio_mixer().join_audio_video_ffmpeg(Path(COMBINED_VIDEO), Path(audio_path), Path(episode_files()[0]))
+
+    def run_title():
+        from generate_title_desc import Generate_title
+        title, desc = Generate_title().generate_content()
+        if title is None:
+            return False
+        os.makedirs(os.path.dirname(TITLE_FILE), exist_ok=True)
+        with open(TITLE_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'title': title, 'description': desc}, f, indent=2)
+
+        print(f'Uploading to Youtube ... \n\n {title} \n\n\n {desc}')
 
-sequencer2 = Sequencer(False, 5)
-sequencer2.create_sequence('male')
+        # uploader = YouTubeUploader()
+        # uploader.authenticate()
+        # try:
+        #     uploader.upload_video(
+        #         file_path="output/test.mp4",  # Required
+        #         title=title,            # Required
+        #         description=desc,  # Required
+        #         category="24",                       # 24 Entertainment"
+        #         keywords="python,youtube,upload",     # Optional, default is ""
+        #         privacy_status="public",             # Optional, default is "public"
+        #     )
+        # except Exception as e:
+        #     print(f"An error occurred: {e}")
+        #     sys.exit(1)
 
-Concat_vids().concat_vids()
+    stages = [
+        Stage('audio', run_audio, inputs=source_audio_files, outputs=modified_audio_files,
+              params=AUDIO_PARAMS)
+    ]
+    track_inputs = lambda: list(PLANS.values()) + animation_files()
+    if mode == 'trims':
+        stages.append(Stage('tracks', run_trims, inputs=lambda: [TRANSCRIPT] + animation_files(),
+                            outputs=list(TRACKS.values())))
+    else:
+        stages.append(Stage('plan', run_plan, inputs=lambda: [TRANSCRIPT] + animation_files(),
+                            outputs=list(PLANS.values()), params={'snap_to_segments': mode == 'segments'}))
 
-Combine_vids().run_combine()
+    if mode in ('single_pass', 'compositor'):
+        stages.append(Stage('render', run_render, inputs=lambda: track_inputs() + modified_audio_files(),
+                            outputs=episode_files, params={'mode': mode}, deps=['plan', 'audio']))
+    else:
+        if mode != 'trims':
+            stages.append(Stage('tracks', run_tracks, inputs=track_inputs, outputs=list(TRACKS.values()),
+                                params={'mode': mode}, deps=['plan']))
+        stages += [
+            Stage('combine', run_combine, inputs=list(TRACKS.values()), outputs=[COMBINED_VIDEO],
+                  deps=['tracks']),
+            Stage('mix', run_mix, inputs=lambda: [COMBINED_VIDEO] + modified_audio_files(),
+                  outputs=episode_files, deps=['combine', 'audio'])
+        ]
+    stages.append(Stage('title', run_title, inputs=[TRANSCRIPT], outputs=[TITLE_FILE]))
+    return stages
 
-Audio_mod().process_audio_files()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render an episode, re-running only the stages whose inputs changed.")
+    parser.add_argument('stages', nargs='*',
+                        help="Stages to run (default: all). Use --list to see them.")
+    parser.add_argument('--jobs', '-j', type=int, default=SEQUENCE_WORKERS,
+                        help=f"Worker budget of the stages (default: {SEQUENCE_WORKERS}).")
+    parser.add_argument('--mode', choices=RENDER_MODES, default=RENDER_MODE,
+                        help=f"How the video is rendered (default: '{RENDER_MODE}').")
+    parser.add_argument('--force', action='store_true',
+                        help="Run the selected stages even if they are up to date.")
+    parser.add_argument('--quota-gb', type=float, default=ARTIFACT_QUOTA_GB,
+                        help=f"Disk quota of the artifact store in GiB (default: {ARTIFACT_QUOTA_GB}).")
+    parser.add_argument('--trace', default=TRACE_FILE,
+                        help=f"Trace file of the ffmpeg/ffprobe calls (default: '{TRACE_FILE}', '' disables it).")
+    parser.add_argument('--profile', metavar='DIR',
+                        help="Write a cProfile and a collapsed-stack profile of every stage run into DIR "
+                             "(stages then run one at a time).")
+    parser.add_argument('--list', action='store_true', help="List the stages and exit.")
+    args = parser.parse_args(argv)
 
-Audio_mixer().mix_audio()
+    stages = build_stages(args.mode, max(1, args.jobs))
+    if args.list:
+        for stage in stages:
+            print(f"{stage.name:10} <- {', '.join(stage.deps) or '-'}")
+        return 0
 
-title, desc = Generate_title().generate_content()
+    pipeline = Pipeline(
+        stages,
+        store=ArtifactStore(max_bytes=int(args.quota_gb * 1024 ** 3)),
+        jobs=max(1, args.jobs),
+        force=args.force
+    )
+    if args.trace:
+        subprocess_runner.start_trace(args.trace)
+    else:
+        # A trace inherited from the environment would otherwise still be written
+        os.environ.pop(subprocess_runner.TRACE_ENV, None)
+    if args.profile:
+        profiling.enable(args.profile)
+    try:
+        results = pipeline.run(args.stages or None)
+    except ValueError as e:
+        print(f"[Error] {e}")
+        return 2
+    subprocess_runner.print_summary()
+    return 1 if 'failed' in results.values() else 0
 
-print(f'Uploading to Youtube ... \n\n {title} \n\n\n {desc}')
 
-# uploader = YouTubeUploader()
-# uploader.authenticate()
-# try:
-#     uploader.upload_video(
-#         file_path="output/test.mp4",  # Required
-#         title=title,            # Required
-#         description=desc,  # Required
-#         category="24",                       # 24 Entertainment"
-#         keywords="python,youtube,upload",     # Optional, default is ""
-#         privacy_status="public",             # Optional, default is "public"
-#     )
-# except Exception as e:
-#     print(f"An error occurred: {e}")
-#     sys.exit(1)
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
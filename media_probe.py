@@ -0,0 +1,281 @@
+import os
+import json
+import threading
+import subprocess
+import subprocess_runner
+from file_utils import file_hash, write_json_atomic
+from concurrent.futures import ThreadPoolExecutor
+
+class MediaProbe:
+    # Bump whenever the shape of the media facts changes, so older cache entries are re-probed
+    CACHE_VERSION = 3
+
+    def __init__(self, cache_path=None, use_hash=False, keyframes=True, max_workers=None):
+        """
+        One place to ask for media facts. Every file is probed with a single ffprobe pass
+        that returns its streams, duration, fps, resolution, codec profile, keyframe timestamps
+        and audio layout; results are cached in memory and, with cache_path, persisted as JSON.
+
+        :param cache_path: Path of the persistent cache. None keeps the cache in memory only.
+        :param use_hash: If True, entries whose size or mtime changed are revalidated
+                         by content hash before probing again.
+        :param keyframes: If True, the probe also lists the video packets to collect keyframe
+                          timestamps. Turn off for long files when keyframes are not needed.
+        :param max_workers: Number of concurrent ffprobe processes for batched probing.
+        """
+        self.use_hash = use_hash
+        self.keyframes = keyframes
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self._cache = {}
+        self._cache_file = None
+        self._cache_dirty = False
+        self._cache_lock = threading.Lock()
+        if cache_path:
+            self.load_cache(cache_path)
+
+    def load_cache(self, cache_path):
+        """
+        Load the persistent cache from disk (no-op if it is already the loaded one).
+        """
+        if self._cache_file == cache_path:
+            return
+        # Keep what is already unsaved so switching files never loses probes
+        self.save_cache()
+        with self._cache_lock:
+            self._cache = {}
+            self._cache_file = cache_path
+            self._cache_dirty = False
+            if os.path.isfile(cache_path):
+                try:
+                    with open(cache_path, 'r', encoding='utf-8') as f:
+                        self._cache = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Warning: Ignoring unreadable media cache '{cache_path}': {e}")
+
+    def save_cache(self):
+        """
+        Write the cache back to disk if anything changed (atomically, via a temp file).
+        """
+        with self._cache_lock:
+            if not self._cache_dirty or not self._cache_file:
+                return
+            write_json_atomic(self._cache, self._cache_file)
+            self._cache_dirty = False
+
+    def _cache_key(self, abs_path):
+        """
+        Keys are relative to the cache file so a library can move as a whole.
+        """
+        if self._cache_file:
+            return os.path.relpath(abs_path, os.path.dirname(os.path.abspath(self._cache_file)))
+        return abs_path
+
+    def _parse_rate(self, rate):
+        """
+        Convert an ffprobe rational ('24/1') to a float, None if undefined.
+        """
+        num, _, den = (rate or '0/0').partition('/')
+        try:
+            num, den = float(num), float(den or 1)
+        except ValueError:
+            return None
+        return num / den if num and den else None
+
+    def _run_ffprobe(self, path):
+        """
+        Probe a file with a single ffprobe call.
+
+        :return: Media facts dictionary or None if failed.
+        """
+        entries = ('format=duration'
+                   ':stream=index,codec_type,codec_name,width,height,avg_frame_rate,r_frame_rate,'
+                   'nb_frames,pix_fmt,profile,extradata_hash,channels,channel_layout,sample_rate')
+        if self.keyframes:
+            entries += ':packet=stream_index,pts_time,flags'
+
+        result = subprocess_runner.run(
+            ['ffprobe', '-v', 'error', '-show_data_hash', 'CRC32', '-show_entries', entries, '-of', 'json', path],
+            stage='probe',
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        if result.returncode != 0:
+            print(f"ffprobe error for '{path}': {result.stderr.strip()}")
+            return None
+
+        data = json.loads(result.stdout)
+        streams = data.get('streams', [])
+        video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        duration = float(data['format']['duration'])
+
+        media = {
+            'duration': duration,
+            'streams': [
+                {'index': s.get('index'), 'type': s.get('codec_type'), 'codec': s.get('codec_name')}
+                for s in streams
+            ],
+            'codec': None,
+            'fps': None,
+            'frame_rate': None,
+            'width': None,
+            'height': None,
+            'pix_fmt': None,
+            'profile': None,
+            'extradata_hash': None,
+            'frame_count': None,
+            'keyframes': None,
+            'audio': None
+        }
+
+        if video:
+            fps = self._parse_rate(video.get('avg_frame_rate')) or self._parse_rate(video.get('r_frame_rate'))
+            frame_count = video.get('nb_frames')
+            if frame_count not in (None, 'N/A'):
+                frame_count = int(frame_count)
+            else:
+                frame_count = int(round(duration * fps)) if fps else None
+            media.update({
+                'codec': video.get('codec_name'),
+                'fps': fps,
+                # Nominal rate of the stream timebase grid (avg_frame_rate is the mean over the file)
+                'frame_rate': self._parse_rate(video.get('r_frame_rate')),
+                'width': video.get('width'),
+                'height': video.get('height'),
+                'pix_fmt': video.get('pix_fmt'),
+                'profile': video.get('profile'),
+                'extradata_hash': video.get('extradata_hash'),
+                'frame_count': frame_count
+            })
+            if self.keyframes:
+                media['keyframes'] = sorted(
+                    float(packet['pts_time']) for packet in data.get('packets', [])
+                    if packet.get('stream_index') == video.get('index')
+                    and 'K' in packet.get('flags', '')
+                    and packet.get('pts_time') not in (None, 'N/A')
+                )
+
+        if audio:
+            media['audio'] = {
+                'codec': audio.get('codec_name'),
+                'channels': audio.get('channels'),
+                'channel_layout': audio.get('channel_layout'),
+                'sample_rate': int(audio['sample_rate']) if audio.get('sample_rate') else None
+            }
+
+        return media
+
+    def _lookup(self, abs_path, stat):
+        """
+        Return the cached media facts if the entry is still valid, else None.
+        """
+        with self._cache_lock:
+            entry = self._cache.get(self._cache_key(abs_path))
+        if not entry or entry.get('version') != self.CACHE_VERSION:
+            return None
+        if self.keyframes and entry['media']['keyframes'] is None and entry['media']['codec']:
+            return None
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['media']
+        return None
+
+    def _store(self, abs_path, stat, media, content_hash=None):
+        with self._cache_lock:
+            self._cache[self._cache_key(abs_path)] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha1': content_hash,
+                'version': self.CACHE_VERSION,
+                'media': media
+            }
+            self._cache_dirty = True
+
+    def _probe_cold(self, abs_path, stat):
+        """
+        Probe a file that missed the stat check (revalidating by hash first if enabled).
+        """
+        content_hash = file_hash(abs_path) if self.use_hash else None
+        if content_hash:
+            with self._cache_lock:
+                entry = self._cache.get(self._cache_key(abs_path))
+            if entry and entry.get('sha1') == content_hash and entry.get('version') == self.CACHE_VERSION:
+                self._store(abs_path, stat, entry['media'], content_hash)
+                return entry['media']
+
+        try:
+            media = self._run_ffprobe(abs_path)
+        except Exception as e:
+            print(f"Exception while probing '{abs_path}': {e}")
+            return None
+        if media is not None:
+            self._store(abs_path, stat, media, content_hash)
+        return media
+
+    def probe(self, path):
+        """
+        Media facts of a single file.
+
+        :param path: Path to the media file.
+        :return: Dictionary with duration, streams, codec, fps, frame_rate, width, height,
+                 pix_fmt, profile, extradata_hash, frame_count, keyframes and audio, or None if the file
+                 could not be probed.
+        """
+        return self.probe_many([path])[path]
+
+    def probe_many(self, paths):
+        """
+        Media facts of many files in one call. Cached files are answered from the cache;
+        cold files are probed concurrently in a thread pool.
+
+        :param paths: Iterable of paths.
+        :return: Dictionary of path -> media facts (None for files that could not be probed).
+        """
+        results = {}
+        cold = []
+        for path in paths:
+            abs_path = os.path.abspath(path)
+            try:
+                stat = os.stat(abs_path)
+            except OSError as e:
+                print(f"Error: Cannot probe '{path}': {e}")
+                results[path] = None
+                continue
+            media = self._lookup(abs_path, stat)
+            if media is None:
+                cold.append((path, abs_path, stat))
+            results[path] = media
+
+        if len(cold) == 1:
+            path, abs_path, stat = cold[0]
+            results[path] = self._probe_cold(abs_path, stat)
+        elif cold:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                probed = executor.map(lambda job: self._probe_cold(job[1], job[2]), cold)
+                for (path, _, _), media in zip(cold, probed):
+                    results[path] = media
+
+        return results
+
+    def get_duration(self, path):
+        """
+        :return: Duration in seconds (float) or None if failed.
+        """
+        media = self.probe(path)
+        return media['duration'] if media else None
+
+    def get_resolution(self, path):
+        """
+        :return: (width, height) of the first video stream or None if failed.
+        """
+        media = self.probe(path)
+        if not media or media['width'] is None:
+            return None
+        return media['width'], media['height']
+
+    def get_keyframes(self, path):
+        """
+        :return: Sorted keyframe timestamps in seconds or None if failed.
+        """
+        media = self.probe(path)
+        return media['keyframes'] if media else None
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from segment_cache import SegmentCache
+from file_utils import file_hash, write_json_atomic
+from profiling import profile_stage, is_enabled as profiling_enabled
+
+class ArtifactStore(SegmentCache):
+    # Stage outputs of any type share the store, so entries carry a neutral extension
+    SUFFIX = '.artifact'
+
+    def __init__(self, cache_dir='.artifacts', max_bytes=10 * 1024 ** 3):
+        """
+        Content-addressed store of stage outputs with a disk quota and LRU eviction
+        (see SegmentCache). An output is keyed by the fingerprint of the stage that
+        produced it and its path.
+        """
+        super().__init__(cache_dir=cache_dir, max_bytes=max_bytes)
+
+    def output_key(self, fingerprint, path):
+        return hashlib.sha1(f"{fingerprint}|{os.path.normpath(path)}".encode('utf-8')).hexdigest()
+
+class Stage:
+
+    def __init__(self, name, run, inputs=(), outputs=(), params=None, deps=()):
+        """
+        One step of the pipeline.
+
+        :param name: Stage name (used on the command line).
+        :param run: Callable doing the work. Returning False marks the stage as failed.
+        :param inputs: Paths the stage reads, or a callable returning them. Their content
+                       hashes are part of the fingerprint.
+        :param outputs: Paths the stage writes, or a callable returning them.
+        :param params: JSON serializable settings that change the outputs.
+        :param deps: Names of the stages producing this stage's inputs.
+        """
+        self.name = name
+        self.run = run
+        self._inputs = inputs
+        self._outputs = outputs
+        self.params = params or {}
+        self.deps = list(deps)
+
+    def inputs(self):
+        return list(self._inputs() if callable(self._inputs) else self._inputs)
+
+    def outputs(self):
+        return list(self._outputs() if callable(self._outputs) else self._outputs)
+
+class Pipeline:
+
+    def __init__(self, stages, state_path='.pipeline_state.json', store=None, jobs=1, force=False):
+        """
+        DAG of stages that only re-runs what changed.
+
+        Every stage is fingerprinted by the content hashes of its inputs and its params.
+        A stage whose fingerprint and outputs match the last run is skipped; one whose
+        outputs for that fingerprint are still in the artifact store is restored from it.
+        Only the others run. File hashes are memoized by (size, mtime) in the state file,
+        so checking an unchanged episode never reads the media again.
+
+        :param stages: List of Stage, in any order.
+        :param state_path: JSON file with the fingerprints of the last runs.
+        :param store: ArtifactStore for the stage outputs. None disables it.
+        :param jobs: Number of independent stages run at the same time.
+        :param force: Run the selected stages even if they are up to date.
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.store = store
+        self.jobs = max(1, jobs)
+        self.force = force
+        self.state = self._load_state()
+
+    def _load_state(self):
+        state = {'stages': {}, 'hashes': {}}
+        if os.path.isfile(self.state_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"[Pipeline] Ignoring unreadable state '{self.state_path}': {e}")
+        return state
+
+    def _save_state(self):
+        """
+        Write the state atomically (via a temp file).
+        """
+        write_json_atomic(self.state, self.state_path)
+
+    def file_hash(self, path):
+        """
+        SHA-1 of a file, memoized by (path, size, mtime) across runs.
+        """
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        memo = self.state['hashes'].get(key)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+        content_hash = file_hash(path)
+        self.state['hashes'][key] = [stat.st_size, stat.st_mtime_ns, content_hash]
+        return content_hash
+
+    def fingerprint(self, stage):
+        """
+        :return: Fingerprint of a stage, None if one of its inputs is missing.
+        """
+        inputs = []
+        for path in sorted(set(stage.inputs())):
+            if not os.path.isfile(path):
+                return None
+            inputs.append([os.path.normpath(path), self.file_hash(path)])
+        raw = json.dumps({'stage': stage.name, 'params': stage.params, 'inputs': inputs}, sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _is_up_to_date(self, stage, fingerprint):
+        recorded = self.state['stages'].get(stage.name)
+        if not recorded or recorded['fingerprint'] != fingerprint:
+            return False
+        outputs = stage.outputs()
+        if sorted(recorded['outputs']) != sorted(os.path.normpath(path) for path in outputs):
+            return False
+        return all(os.path.isfile(path) and self.file_hash(path) == recorded['outputs'][os.path.normpath(path)]
+                   for path in outputs)
+
+    def _restore(self, stage, fingerprint):
+        """
+        Bring back the outputs of a fingerprint from the artifact store.
+
+        :return: True if every output was restored.
+        """
+        if not self.store:
+            return False
+        outputs = stage.outputs()
+        keys = [self.store.output_key(fingerprint, path) for path in outputs]
+        if not outputs or not all(os.path.isfile(self.store._entry_path(key)) for key in keys):
+            return False
+        for key, path in zip(keys, outputs):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            if not self.store.fetch(key, path):
+                return False
+        return True
+
+    def _record(self, stage, fingerprint):
+        self.state['stages'][stage.name] = {
+            'fingerprint': fingerprint,
+            'outputs': {os.path.normpath(path): self.file_hash(path) for path in stage.outputs()}
+        }
+
+    def _run_stage(self, stage):
+        """
+        Run one stage unless it is up to date.
+
+        :return: 'up to date', 'restored', 'ran' or 'failed'.
+        """
+        fingerprint = self.fingerprint(stage)
+        if fingerprint is None:
+            missing = [path for path in stage.inputs() if not os.path.isfile(path)]
+            print(f"[Pipeline] {stage.name}: missing inputs {missing}")
+            return 'failed'
+
+        if not self.force:
+            if self._is_up_to_date(stage, fingerprint):
+                return 'up to date'
+            if self._restore(stage, fingerprint):
+                self._record(stage, fingerprint)
+                return 'restored'
+
+        # Outputs may share their inode with a store entry; never write through it
+        for path in stage.outputs():
+            if os.path.lexists(path):
+                os.remove(path)
+
+        print(f"[Pipeline] Running {stage.name}...")
+        try:
+            with profile_stage(stage.name):
+                ok = stage.run()
+        except (Exception, SystemExit) as e:
+            print(f"[Pipeline] {stage.name} raised {e!r}")
+            ok = False
+        outputs = stage.outputs()
+        missing = [path for path in outputs if not os.path.isfile(path)]
+        if ok is False or missing:
+            if missing:
+                print(f"[Pipeline] {stage.name}: outputs not written {missing}")
+            return 'failed'
+
+        if self.store:
+            for path in outputs:
+                self.store.store(self.store.output_key(fingerprint, path), path)
+        self._record(stage, fingerprint)
+        return 'ran'
+
+    def _check_order(self, names):
+        """
+        Raise ValueError if the dependencies between the given stages form a cycle, which
+        would leave run() with stages that never become ready.
+        """
+        remaining = list(names)
+        while remaining:
+            ready = [name for name in remaining
+                     if all(dep not in remaining for dep in self.stages[name].deps)]
+            if not ready:
+                raise ValueError(f"Stages {remaining} can never run: their dependencies form a cycle")
+            remaining = [name for name in remaining if name not in ready]
+
+    def run(self, selected=None):
+        """
+        Run the selected stages (all by default) in dependency order; stages whose
+        dependencies are done run concurrently, up to `jobs` at a time. Dependencies
+        outside the selection are taken as they are on disk.
+
+        :return: Dictionary of stage name -> outcome.
+        :raises ValueError: On an unknown stage or a dependency cycle.
+        """
+        selected = list(selected or self.stages)
+        unknown = [name for name in selected if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown stages: {unknown}. Available: {list(self.stages)}")
+
+        start = time.perf_counter()
+        results = {}
+        pending = [name for name in self.stages if name in selected]
+        self._check_order(pending)
+        # Profiles are per stage, so stages are profiled one at a time (see profile_stage)
+        stage_workers = 1 if profiling_enabled() else self.jobs
+        with ThreadPoolExecutor(max_workers=stage_workers) as executor:
+            while pending:
+                ready = [name for name in pending
+                         if all(dep in results or dep not in pending for dep in self.stages[name].deps)]
+                outcomes = list(executor.map(lambda name: self._run_stage(self.stages[name]), ready))
+                for name, outcome in zip(ready, outcomes):
+                    results[name] = outcome
+                    pending.remove(name)
+                    print(f"[Pipeline] {name}: {outcome}")
+                self._save_state()
+                if 'failed' in outcomes:
+                    for name in pending:
+                        results[name] = 'skipped'
+                        print(f"[Pipeline] {name}: skipped")
+                    break
+
+        print(f"[Pipeline] Done in {time.perf_counter() - start:.2f}s")
+        return results
@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+# Folder receiving the stage profiles; profiling is off when it is not set. Only the
+# threads of this process are profiled, not the worker processes a stage starts
+PROFILE_ENV = 'PIPELINE_PROFILE'
+
+# Seconds between two stack samples of the collapsed-stack profile
+SAMPLE_INTERVAL = 0.005
+
+def enable(profile_dir):
+    """
+    Turn profiling on for the stages run from now on.
+    """
+    os.environ[PROFILE_ENV] = os.path.abspath(profile_dir)
+
+def is_enabled():
+    return bool(os.environ.get(PROFILE_ENV))
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+
+    THREAD_NAME = 'StackSampler'
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        """
+        Sampling profiler: a thread recording, at a fixed interval, the Python stack of
+        the thread that created it and of every thread started after it, counted per
+        distinct stack. Unlike cProfile it also sees the worker threads a stage starts.
+        Threads that were already running (other stages, idle pool workers, the main
+        thread waiting on them) and other samplers are left out.
+        """
+        self.interval = interval
+        self.counts = {}
+        self._root_id = threading.get_ident()
+        self._skip_ids = {thread.ident for thread in threading.enumerate()} - {self._root_id}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name=self.THREAD_NAME, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in self._skip_ids or names.get(thread_id) == self.THREAD_NAME:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path):
+        """
+        Write the samples as collapsed stacks ("root;...;leaf count" per line), the input
+        of flamegraph.pl, speedscope and inferno.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profile_stage(name, profile_dir=None):
+    """
+    Profile the body of the with statement as stage `name` when profiling is on
+    (profile_dir, or the PIPELINE_PROFILE folder). Writes `{name}.prof` (cProfile of
+    the calling thread, for pstats or snakeviz) and `{name}.collapsed` (sampled stacks
+    of the calling thread and the threads it starts, for flamegraph tools). When
+    profiling is off this costs one environment lookup.
+
+    Profile one stage at a time: only one cProfile can be active per process (Python
+    3.12 refuses a second one; the stage then gets no `.prof`), and the sampler cannot
+    tell apart threads that concurrent stages start.
+    """
+    profile_dir = profile_dir or os.environ.get(PROFILE_ENV)
+    if not profile_dir:
+        yield
+        return
+
+    os.makedirs(profile_dir, exist_ok=True)
+    sampler = StackSampler()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        print(f"[Profile] {name}: no cProfile, another profiler is active ({e})")
+        profiler = None
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        sampler.stop()
+        paths = []
+        if profiler:
+            paths.append(os.path.join(profile_dir, f"{name}.prof"))
+            profiler.dump_stats(paths[-1])
+        paths.append(os.path.join(profile_dir, f"{name}.collapsed"))
+        sampler.write_collapsed(paths[-1])
+        print(f"[Profile] {name}: {time.perf_counter() - start:.2f}s, "
+              f"{sum(sampler.counts.values())} samples -> {', '.join(paths)}")
@@ -1,5 +1,17 @@
 import os
+import json
 import subprocess
+import subprocess_runner
+from file_utils import file_hash, write_json_atomic
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from media_probe import MediaProbe
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv')
+MANIFEST_FILENAME = '.normalize_manifest.json'
+MEZZANINE_MANIFEST_FILENAME = '.mezzanine_manifest.json'
+# Short-GOP copy of a clip, stored next to it (_with_lip_move.mp4 -> _with_lip_move.mezzanine.mp4)
+MEZZANINE_SUFFIX = '.mezzanine.mp4'
+TARGET_FPS = 24
 
 def reencode_videos_in_folder(folder_path):
     """
@@ -33,7 +45,7 @@ def reencode_videos_in_folder(folder_path):
                 print(f"[Reencode] Processing: {input_path}")
                 
                 # Run ffmpeg
-                subprocess.run(ffmpeg_cmd, check=True)
+                subprocess_runner.run(ffmpeg_cmd, stage='reencode', check=True)
 
                 # Remove the original file
                 os.remove(input_path)
@@ -42,8 +54,261 @@ def reencode_videos_in_folder(folder_path):
                 print(f"[Reencode] Replaced {input_path} with 24fps H.264 version.\n")
 
 
+def mezzanine_path(path):
+    """
+    Path of the mezzanine variant of a library clip.
+    """
+    return os.path.splitext(path)[0] + MEZZANINE_SUFFIX
+
+def is_mezzanine(path):
+    return path.endswith(MEZZANINE_SUFFIX)
+
+def _load_manifest(manifest_path):
+    if not os.path.isfile(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[Normalize] Ignoring unreadable manifest '{manifest_path}': {e}")
+        return {}
+
+def _save_manifest(manifest_path, manifest):
+    """
+    Write the manifest atomically (via a temp file).
+    """
+    write_json_atomic(manifest, manifest_path)
+
+def _manifest_entry(path, content_hash=None):
+    stat = os.stat(path)
+    return {
+        'sha1': content_hash or file_hash(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+def _is_normalized(path, entry):
+    """
+    True if the file is still the one recorded in the manifest.
+    """
+    if not entry:
+        return False
+    stat = os.stat(path)
+    if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    # Touched but not changed (e.g. copied with a new mtime)
+    return entry['size'] == stat.st_size and entry['sha1'] == file_hash(path)
+
+def conforms(media):
+    """
+    True if probed media facts already match the library format:
+    H.264 video at 24 fps, and AAC audio if there is audio at all.
+    """
+    if not media or media['codec'] != 'h264':
+        return False
+    if not media['fps'] or abs(media['fps'] - TARGET_FPS) > 0.01:
+        return False
+    return media['audio'] is None or media['audio']['codec'] == 'aac'
+
+def normalize_video(input_path, preset='slow', threads=None):
+    """
+    Re-encode one video to the library format (same settings as
+    reencode_videos_in_folder). The result is written next to the input and
+    atomically renamed over it, so the file is never seen half written.
+    """
+    directory, filename = os.path.split(input_path)
+    stem, extension = os.path.splitext(filename)
+    temp_path = os.path.join(directory, f".{stem}.normalizing{extension}")
+
+    ffmpeg_cmd = [
+        "ffmpeg",
+        "-y",
+        "-v", "error",
+        "-i", input_path,
+        "-c:v", "libx264",
+        "-preset", preset,
+        "-crf", "18",
+        "-c:a", "aac",
+        "-r", str(TARGET_FPS)
+    ]
+    if threads:
+        ffmpeg_cmd += ["-threads", str(threads)]
+    ffmpeg_cmd.append(temp_path)
+
+    try:
+        subprocess_runner.run(ffmpeg_cmd, stage='normalize', check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, input_path)
+
+def normalize_videos_in_folder(folder_path, max_workers=None, preset='slow'):
+    """
+    Incremental, parallel version of reencode_videos_in_folder.
+
+    Files recorded in `{folder_path}/.normalize_manifest.json` and unchanged since are
+    skipped without probing. The others are probed; files that already conform are only
+    recorded, the rest are re-encoded in a worker pool and replaced atomically. The
+    manifest keeps the content hash of every normalized file, so a run after adding a
+    new character pack only touches the new files.
+
+    :param folder_path: Library folder (e.g. 'animations').
+    :param max_workers: Number of concurrent ffmpeg encodes.
+    :param preset: libx264 preset of the re-encode.
+    :return: Dictionary with the number of skipped, conforming, encoded and failed files.
+    """
+    manifest_path = os.path.join(folder_path, MANIFEST_FILENAME)
+    manifest = _load_manifest(manifest_path)
+    counts = {'skipped': 0, 'conforming': 0, 'encoded': 0, 'failed': 0}
+
+    candidates = []
+    for root, dirs, files in os.walk(folder_path):
+        for filename in sorted(files):
+            if not filename.lower().endswith(VIDEO_EXTENSIONS) or filename.startswith('.'):
+                continue
+            if is_mezzanine(filename):
+                continue
+            path = os.path.join(root, filename)
+            key = os.path.relpath(path, folder_path)
+            if _is_normalized(path, manifest.get(key)):
+                counts['skipped'] += 1
+            else:
+                candidates.append((key, path))
+
+    media = MediaProbe(keyframes=False).probe_many(path for _, path in candidates)
+    jobs = []
+    for key, path in candidates:
+        if conforms(media[path]):
+            manifest[key] = _manifest_entry(path)
+            counts['conforming'] += 1
+        else:
+            jobs.append((key, path))
+
+    if jobs:
+        max_workers = max_workers or max(1, min(len(jobs), (os.cpu_count() or 1) // 2))
+        threads = max(1, (os.cpu_count() or 1) // max_workers)
+        print(f"[Normalize] Re-encoding {len(jobs)} files with {max_workers} workers...")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(normalize_video, path, preset, threads): (key, path)
+                for key, path in jobs
+            }
+            for future in as_completed(futures):
+                key, path = futures[future]
+                try:
+                    future.result()
+                except subprocess.CalledProcessError as e:
+                    print(f"[Normalize] Failed: {path}")
+                    print(e.stderr.decode('utf-8', errors='ignore'))
+                    counts['failed'] += 1
+                    continue
+                manifest[key] = _manifest_entry(path)
+                counts['encoded'] += 1
+                print(f"[Normalize] Replaced {path} with 24fps H.264 version.")
+
+    _save_manifest(manifest_path, manifest)
+    print(f"[Normalize] {counts['encoded']} encoded, {counts['conforming']} already conforming, "
+          f"{counts['skipped']} unchanged, {counts['failed']} failed.")
+    return counts
+
+def build_mezzanine(input_path, gop=1, threads=None):
+    """
+    Encode the mezzanine variant of one clip: 24 fps H.264 with a keyframe every `gop`
+    frames (gop=1 is all-intra) and no B-frames, so every cut on a multiple of `gop`
+    frames can be stream-copied. Written to a temp file and renamed atomically.
+    """
+    output_path = mezzanine_path(input_path)
+    directory, filename = os.path.split(output_path)
+    temp_path = os.path.join(directory, f".{filename}.tmp.mp4")
+
+    ffmpeg_cmd = [
+        "ffmpeg",
+        "-y",
+        "-v", "error",
+        "-i", input_path,
+        "-c:v", "libx264",
+        "-preset", "slow",
+        "-crf", "18",
+        "-pix_fmt", "yuv420p",
+        "-g", str(gop),
+        "-keyint_min", str(gop),
+        "-sc_threshold", "0",
+        "-bf", "0",
+        "-c:a", "aac",
+        "-r", str(TARGET_FPS)
+    ]
+    if threads:
+        ffmpeg_cmd += ["-threads", str(threads)]
+    ffmpeg_cmd.append(temp_path)
+
+    try:
+        subprocess_runner.run(ffmpeg_cmd, stage='mezzanine', check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, output_path)
+    return output_path
+
+def build_mezzanine_in_folder(folder_path, gop=1, max_workers=None):
+    """
+    Build the mezzanine variant of every library clip that does not have an up to date
+    one yet (see build_mezzanine). `{folder_path}/.mezzanine_manifest.json` records the
+    source stat and GOP each mezzanine was built from, so reruns only encode new or
+    changed clips. ScanPath picks the mezzanine files up automatically.
+
+    :param folder_path: Library folder (e.g. 'animations').
+    :param gop: Keyframe interval in frames (1 = all-intra).
+    :param max_workers: Number of concurrent ffmpeg encodes.
+    :return: Number of mezzanine files built.
+    """
+    manifest_path = os.path.join(folder_path, MEZZANINE_MANIFEST_FILENAME)
+    manifest = _load_manifest(manifest_path)
+
+    jobs = []
+    for root, dirs, files in os.walk(folder_path):
+        for filename in sorted(files):
+            if not filename.lower().endswith('.mp4') or filename.startswith('.') or is_mezzanine(filename):
+                continue
+            path = os.path.join(root, filename)
+            key = os.path.relpath(path, folder_path)
+            stat = os.stat(path)
+            entry = manifest.get(key)
+            if (entry and os.path.isfile(mezzanine_path(path)) and entry['gop'] == gop
+                    and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns):
+                continue
+            jobs.append((key, path, stat))
+
+    built = 0
+    if jobs:
+        max_workers = max_workers or max(1, min(len(jobs), (os.cpu_count() or 1) // 2))
+        threads = max(1, (os.cpu_count() or 1) // max_workers)
+        print(f"[Mezzanine] Encoding {len(jobs)} files (GOP {gop}) with {max_workers} workers...")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(build_mezzanine, path, gop, threads): (key, path, stat)
+                for key, path, stat in jobs
+            }
+            for future in as_completed(futures):
+                key, path, stat = futures[future]
+                try:
+                    output_path = future.result()
+                except subprocess.CalledProcessError as e:
+                    print(f"[Mezzanine] Failed: {path}")
+                    print(e.stderr.decode('utf-8', errors='ignore'))
+                    continue
+                manifest[key] = {'gop': gop, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                built += 1
+                print(f"[Mezzanine] {path} -> {output_path}")
+
+    _save_manifest(manifest_path, manifest)
+    print(f"[Mezzanine] {built} built, {len(jobs) - built} failed, up to date otherwise.")
+    return built
+
 if __name__ == "__main__":
     # Example usage:
     animations_folder = "animations"  # or the absolute path
-    reencode_videos_in_folder(animations_folder)
-    print("[Reencode] Done re-encoding all videos in:", animations_folder)
+    normalize_videos_in_folder(animations_folder)
+    build_mezzanine_in_folder(animations_folder)
+    print("[Reencode] Done normalizing all videos in:", animations_folder)
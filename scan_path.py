@@ -3,47 +3,71 @@
 
 
 import os
-import subprocess
-import json
+from media_probe import MediaProbe
+from re_encode import mezzanine_path
 
 class ScanPath:
-    def __init__(self):
-        pass
+    CACHE_FILENAME = '.media_cache.json'
+
+    def __init__(self, cache_path=None, use_hash=False, prefer_mezzanine=True):
+        """
+        :param cache_path: Path of the persistent media metadata cache. Defaults to
+                           '.media_cache.json' inside the scanned animations directory.
+        :param use_hash: If True, entries whose size or mtime changed are revalidated
+                         by content hash before falling back to ffprobe.
+        :param prefer_mezzanine: If True, animations whose two clips both have a short-GOP
+                                 mezzanine variant (see re_encode.build_mezzanine_in_folder)
+                                 list the mezzanine files in 'paths' and the originals
+                                 in 'source_paths'.
+        """
+        self.cache_path = cache_path
+        self.prefer_mezzanine = prefer_mezzanine
+        self.probe = MediaProbe(cache_path=cache_path, use_hash=use_hash)
+
+    def save_cache(self):
+        """
+        Write the media metadata cache back to disk if anything changed.
+        """
+        self.probe.save_cache()
+
+    def get_video_metadata(self, path):
+        """
+        Media facts of a video (see MediaProbe.probe).
+
+        :param path: Path to the video file
+        :return: Dictionary of media facts or None if failed
+        """
+        return self.probe.probe(path)
 
     def get_video_duration_ffprobe(self, path):
         """
-        Retrieve the duration of a video file using ffprobe.
+        Retrieve the duration of a video file using ffprobe (through the metadata cache).
 
         :param path: Path to the video file
         :return: Duration in seconds (float) or None if failed
         """
         try:
-            # Run ffprobe command to get duration in JSON format
-            result = subprocess.run(
-                [
-                    'ffprobe',
-                    '-v', 'error',
-                    '-show_entries', 'format=duration',
-                    '-of', 'json',
-                    path
-                ],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            if result.returncode != 0:
-                print(f"ffprobe error for '{path}': {result.stderr.strip()}")
-                return None
-
-            # Parse JSON output
-            data = json.loads(result.stdout)
-            duration = float(data['format']['duration'])
-            return duration
+            return self.probe.get_duration(path)
         except Exception as e:
             print(f"Exception while getting duration for '{path}': {e}")
             return None
 
+    def _collect_clip_paths(self, base_path):
+        """
+        All with / without lip move files under base_path/<gender>/<animation_type>/.
+        """
+        paths = []
+        for gender_dir in os.listdir(base_path):
+            gender_path = os.path.join(base_path, gender_dir)
+            if not os.path.isdir(gender_path):
+                continue
+            for animation_type in os.listdir(gender_path):
+                for filename in ('_with_lip_move.mp4', '_without_lip_move.mp4'):
+                    path = os.path.join(gender_path, animation_type, filename)
+                    if os.path.isfile(path):
+                        paths.append(os.path.abspath(path))
+        return paths
+
     def scan_animations_directory_with_duration_ms(self, base_path='animations'):
         """
         Scan the animations directory and collect video paths and durations.
@@ -67,6 +91,12 @@ class ScanPath:
         if not os.path.isdir(base_path):
             raise ValueError(f"The directory '{base_path}' does not exist.")
 
+        if not self.cache_path:
+            self.probe.load_cache(os.path.join(base_path, self.CACHE_FILENAME))
+
+        # Probe the whole library in one batch (cold files in parallel)
+        self.probe.probe_many(self._collect_clip_paths(base_path))
+
         # Iterate over each gender directory (e.g., 'man', 'girl')
         for gender_dir in os.listdir(base_path):
             gender_path = os.path.join(base_path, gender_dir)
@@ -140,6 +170,12 @@ class ScanPath:
                     else:
                         print(f"Error: Could not retrieve both durations for '{animation_path}'. Setting duration_ms to None.")
 
+                    # Cut from the mezzanine variants when the library has them
+                    mezzanine_paths = [mezzanine_path(path) for path in animation_info['paths']]
+                    if self.prefer_mezzanine and all(os.path.isfile(path) for path in mezzanine_paths):
+                        animation_info['source_paths'] = animation_info['paths']
+                        animation_info['paths'] = mezzanine_paths
+
                     # Add to the dictionary if duration is set
                     if animation_info['duration_ms'] is not None:
                         animations_dict[gender_key][animation_type] = animation_info
@@ -148,4 +184,5 @@ class ScanPath:
                 else:
                     print(f"Info: Incomplete videos for '{animation_type}' in '{gender_key}'. Skipping.")
 
+        self.save_cache()
         return animations_dict
\ No newline at end of file
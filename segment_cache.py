@@ -0,0 +1,181 @@
+import os
+import errno
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+from file_utils import file_hash
+
+# ioctl request that clones a file's extents on copy-on-write filesystems (btrfs, xfs)
+FICLONE = 0x40049409
+
+class SegmentCache:
+    # Extension of the entries in the store
+    SUFFIX = '.mp4'
+
+    def __init__(self, cache_dir='.segment_cache', max_bytes=2 * 1024 ** 3):
+        """
+        Content-addressed store of trimmed segments, shared by every episode rendered
+        on the machine. A segment is keyed by (source content hash, start_ms, end_ms,
+        encode profile); hits are served as a hardlink (or reflink, or copy as a last
+        resort) instead of running ffmpeg again. The least recently used segments are
+        evicted once the store grows past max_bytes.
+
+        :param cache_dir: Folder holding the cached segments.
+        :param max_bytes: Disk quota of the store in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._source_hashes = {}
+        self._total_bytes = None
+        self._lock = threading.Lock()
+
+    def _source_hash(self, path):
+        """
+        SHA-1 of a source file, memoized per (path, size, mtime).
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._source_hashes:
+            self._source_hashes[memo_key] = file_hash(path)
+        return self._source_hashes[memo_key]
+
+    def make_key(self, input_path, start_ms, end_ms, profile):
+        """
+        Content address of a segment.
+
+        :param input_path: Source video.
+        :param start_ms: Start time in milliseconds.
+        :param end_ms: End time in milliseconds.
+        :param profile: String describing every encode setting that affects the output.
+        """
+        raw = f"{self._source_hash(input_path)}|{start_ms}|{end_ms}|{profile}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}{self.SUFFIX}")
+
+    def _link(self, src, dst):
+        """
+        Make dst a hardlink of src, else a reflink, else a plain copy.
+        """
+        if os.path.lexists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError:
+            pass
+        try:
+            with open(src, 'rb') as s, open(dst, 'wb') as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return 'reflink'
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY):
+                raise
+        shutil.copyfile(src, dst)
+        return 'copy'
+
+    def fetch(self, key, output_path):
+        """
+        Materialize a cached segment at output_path.
+
+        :return: True on a hit, False on a miss.
+        """
+        entry = self._entry_path(key)
+        try:
+            # The mtime of an entry is its LRU clock
+            os.utime(entry)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+
+        self._link(entry, output_path)
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key, output_path):
+        """
+        Add a freshly rendered segment to the store, then evict down to the quota.
+        """
+        entry = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Unique across processes: episodes rendered at the same time share the store
+        fd, temp_entry = tempfile.mkstemp(prefix=f".{os.path.basename(entry)}.", suffix='.tmp',
+                                          dir=os.path.dirname(entry))
+        os.close(fd)
+        try:
+            self._link(output_path, temp_entry)
+            with self._lock:
+                # Storing a key again replaces its entry, whose size must not be counted twice
+                try:
+                    replaced_bytes = os.path.getsize(entry)
+                except FileNotFoundError:
+                    replaced_bytes = 0
+                try:
+                    os.replace(temp_entry, entry)
+                except FileNotFoundError:
+                    if not os.path.isfile(entry):
+                        raise
+                    # Lost a race with another process storing the same key: its entry
+                    # holds the same segment
+                    return
+                if self._total_bytes is None:
+                    self._total_bytes = sum(size for _, size, _ in self._entries())
+                else:
+                    self._total_bytes += os.path.getsize(entry) - replaced_bytes
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+        finally:
+            if os.path.lexists(temp_entry):
+                os.remove(temp_entry)
+
+    def _entries(self):
+        """
+        Yield (path, size, mtime) of every cached segment.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                if not filename.endswith(self.SUFFIX):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        """
+        Remove least recently used segments until the store fits in max_bytes.
+        Must be called with the lock held.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._total_bytes = total
+
+    def stats(self):
+        """
+        :return: Dictionary with hits, misses and hit rate of this cache instance.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
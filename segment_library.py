@@ -0,0 +1,241 @@
+import os
+import glob
+import json
+import uuid
+import hashlib
+import subprocess
+import subprocess_runner
+from concurrent.futures import ThreadPoolExecutor
+from media_probe import MediaProbe
+from file_utils import write_json_atomic
+
+class SegmentLibrary:
+    # Bump whenever the segment encode changes, so older libraries are re-cut
+    LIBRARY_VERSION = 1
+    INDEX_FILENAME = 'index.json'
+
+    def __init__(self, segment_dir='.segment_library', segment_ms=250, fps=24, max_workers=None):
+        """
+        The animation clips pre-cut once into fixed-length, frame-aligned segments.
+
+        Every clip is encoded a single time (video only, one encode profile for the whole
+        library, a keyframe at the start of every segment) and split into segments of
+        segment_ms, stored under segment_dir with an index. Once Sequencer snapped a plan
+        to the segment grid (see Sequencer.snap_to_segments), a track is assembled by
+        listing segment files for the concat demuxer with -c copy: no encode at all.
+
+        :param segment_dir: Folder holding the segments and their index.
+        :param segment_ms: Segment length in milliseconds (rounded to whole frames).
+        :param fps: Frame rate of the segments (the render frame rate).
+        :param max_workers: Number of concurrent ffmpeg encodes while building.
+        """
+        self.segment_dir = segment_dir
+        self.fps = fps
+        self.segment_frames = max(1, int(round(segment_ms * fps / 1000.0)))
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 1) // 2)
+        self.probe = MediaProbe(keyframes=False)
+        self.index = self._load_index()
+
+    def _index_path(self):
+        return os.path.join(self.segment_dir, self.INDEX_FILENAME)
+
+    def _load_index(self):
+        index = {
+            'version': self.LIBRARY_VERSION,
+            'fps': self.fps,
+            'segment_frames': self.segment_frames,
+            'sources': {}
+        }
+        if not os.path.isfile(self._index_path()):
+            return index
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable segment library index '{self._index_path()}': {e}")
+            return index
+        if any(loaded.get(key) != index[key] for key in ('version', 'fps', 'segment_frames')):
+            return index
+        return loaded
+
+    def _save_index(self):
+        """
+        Write the index atomically (via a temp file).
+        """
+        write_json_atomic(self.index, self._index_path())
+
+    def _source_key(self, path):
+        return os.path.abspath(path)
+
+    def _is_current(self, path):
+        """
+        True if the clip is in the library and has not changed since it was cut.
+        """
+        entry = self.index['sources'].get(self._source_key(path))
+        if not entry:
+            return False
+        if not all(os.path.isfile(os.path.join(self.segment_dir, name)) for name in entry['segments']):
+            return False
+        stat = os.stat(path)
+        return entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+
+    def _cut(self, path, media):
+        """
+        Encode one clip into its segments.
+
+        :return: Index entry or None if failed.
+        """
+        key = self._source_key(path)
+        prefix = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        stat = os.stat(path)
+        frame_count = media['frame_count']
+        split_frames = list(range(self.segment_frames, frame_count, self.segment_frames))
+
+        # Cut into a fresh folder, then move the segments in place
+        work_dir = os.path.join(self.segment_dir, f".{prefix}.{uuid.uuid4().hex}")
+        os.makedirs(work_dir)
+        cmd = [
+            'ffmpeg', '-y', '-v', 'error',
+            '-i', path,
+            '-map', '0:v:0',
+            '-an',
+            '-c:v', 'libx264',
+            '-preset', 'slow',
+            '-crf', '18',
+            '-pix_fmt', 'yuv420p',
+            '-r', str(self.fps),
+            '-bf', '0',
+            '-sc_threshold', '0',
+            '-force_key_frames', f"expr:eq(mod(n,{self.segment_frames}),0)",
+            '-f', 'segment',
+            '-segment_format', 'mp4',
+            '-reset_timestamps', '1'
+        ]
+        if split_frames:
+            cmd += ['-segment_frames', ','.join(str(frame) for frame in split_frames)]
+        else:
+            cmd += ['-segment_time', '86400']
+        cmd.append(os.path.join(work_dir, '%05d.mp4'))
+
+        try:
+            subprocess_runner.run(cmd, stage='segment_cut', outputs=[work_dir], check=True,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            print(f"[Segments] Error while cutting '{path}':")
+            print(e.stderr.decode('utf-8', errors='ignore'))
+            for part in glob.glob(os.path.join(work_dir, '*')):
+                os.remove(part)
+            os.rmdir(work_dir)
+            return None
+
+        segments = []
+        for part in sorted(glob.glob(os.path.join(work_dir, '*.mp4'))):
+            name = f"{prefix}_{os.path.basename(part)}"
+            os.replace(part, os.path.join(self.segment_dir, name))
+            segments.append(name)
+        os.rmdir(work_dir)
+        return {
+            'segments': segments,
+            'frame_count': frame_count,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns
+        }
+
+    def build(self, paths):
+        """
+        Cut every clip that is not in the library yet (or changed since) and update
+        the index. Unchanged clips are skipped.
+
+        :param paths: Iterable of clip paths.
+        :return: Number of clips cut.
+        """
+        paths = list(dict.fromkeys(paths))
+        stale = [path for path in paths if not self._is_current(path)]
+        if not stale:
+            print(f"[Segments] All {len(paths)} clips are up to date.")
+            return 0
+
+        media = self.probe.probe_many(stale)
+        jobs = [path for path in stale if media[path] and media[path]['frame_count']]
+        for path in stale:
+            if path not in jobs:
+                print(f"[Segments] Skipping '{path}': no readable video stream")
+
+        os.makedirs(self.segment_dir, exist_ok=True)
+        print(f"[Segments] Cutting {len(jobs)} clips into {self.segment_frames} frame segments...")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            entries = list(executor.map(lambda path: self._cut(path, media[path]), jobs))
+
+        cut = 0
+        for path, entry in zip(jobs, entries):
+            if entry:
+                self.index['sources'][self._source_key(path)] = entry
+                cut += 1
+        self._save_index()
+        print(f"[Segments] Cut {cut} clips.")
+        return cut
+
+    def build_from_animations(self, animations_dict):
+        """
+        Build the library for every clip of ScanPath.scan_animations_directory_with_duration_ms.
+        """
+        return self.build(
+            path
+            for role in animations_dict.values()
+            for animation in role.values()
+            for path in animation['paths']
+        )
+
+    def frame_count(self, path):
+        """
+        Frame count of a clip in the library, None if it is not in it.
+        """
+        entry = self.index['sources'].get(self._source_key(path))
+        return entry['frame_count'] if entry else None
+
+    def segment_paths(self, path, first, last):
+        """
+        Segment files [first, last) of a clip.
+        """
+        entry = self.index['sources'][self._source_key(path)]
+        return [os.path.join(self.segment_dir, name) for name in entry['segments'][first:last]]
+
+    def assemble_track(self, plan, output_path):
+        """
+        Write a snapped plan (see Sequencer.snap_to_segments) as one video by stream
+        copying its segments through the concat demuxer.
+
+        :return: True on success, False if the plan has entries off the segment grid
+                 or ffmpeg failed.
+        """
+        entries = plan['entries']
+        if not entries or any('segment_range' not in entry for entry in entries):
+            return False
+
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        list_file = os.path.join(output_dir, f"segments_{uuid.uuid4()}.txt")
+        segment_count = 0
+        with open(list_file, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                for segment_path in self.segment_paths(entry['source'], *entry['segment_range']):
+                    f.write(f"file '{os.path.abspath(segment_path)}'\n")
+                    segment_count += 1
+
+        try:
+            subprocess_runner.run([
+                'ffmpeg', '-y', '-v', 'error',
+                '-f', 'concat', '-safe', '0', '-i', list_file,
+                '-c', 'copy',
+                '-movflags', '+faststart',
+                output_path
+            ], stage='segment_assemble', check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            print("[Segments] Error during assembly:")
+            print(e.stderr.decode('utf-8', errors='ignore'))
+            return False
+        finally:
+            os.remove(list_file)
+
+        print(f"[Segments] Assembled {plan.get('role')} track from {segment_count} segments -> {output_path}")
+        return True
@@ -1,18 +1,30 @@
 from transcript_helper import TranscriptHelper
 from video_ops import VideoOps
+from segment_cache import SegmentCache
 from scan_path import ScanPath
+import os
+import json
 import random
 from common_utils import CommonUtils
 
 scan_path = ScanPath()
 helper = TranscriptHelper('transcript/transcript.txt')
-video_ops = VideoOps()
+# Trims are shared across episodes through the segment cache
+video_ops = VideoOps(segment_cache=SegmentCache())
 picker = CommonUtils()
 
 class Sequencer:
-    def __init__(self, is_speaker1_man, iterations=0):
+    def __init__(self, is_speaker1_man, iterations=0, segment_library=None, snap_tolerance_ms=None):
+        """
+        :param segment_library: Optional SegmentLibrary; plans are snapped to its segment
+                                grid so tracks can be assembled without encoding.
+        :param snap_tolerance_ms: Largest shift of a cut point when snapping. Defaults to
+                                  no limit, which snaps every entry of a clip in the library.
+        """
         self.iterations = iterations #using iterations to check temp
         self.is_speaker1_man = is_speaker1_man
+        self.segment_library = segment_library
+        self.snap_tolerance_ms = snap_tolerance_ms
 
     def aggregate_numbers(self, lst):
         result = []
@@ -23,32 +35,56 @@ class Sequencer:
         return result
 
     def get_turn_time(self):
-        a = speaker1_durations = helper.duration_of_speaking_ms('Speaker 1')
-        b = speaker2_durations = helper.duration_of_speaking_ms('Speaker 2')
-        c = []
-        def concat_turn_by_turn(a, b):
-            for i in range(len(b)):
-                c.append(a[i])
-                c.append(b[i])
-            return c
-
-        turn_time = concat_turn_by_turn(a,b)
-
-        turn_time = self.aggregate_numbers(turn_time)
-        return turn_time
-
-    def create_sequence(self, role):
-        animations_dict = scan_path.scan_animations_directory_with_duration_ms('animations')
+        # Cumulative turn-by-turn durations (Speaker 1, Speaker 2, ...), prefix-summed
+        # once by the compiled transcript
+        return helper.transcript.turn_time_ms('1', '2').tolist()
+
+    def _edl_entry(self, animations_dict, role, choice, lip_index, at_ms, start_ms=None, end_ms=None):
+        """
+        Build a single edit decision list entry.
+
+        :param lip_index: Index into the animation's paths (with / without lip move).
+        :param at_ms: Position of the entry on the output timeline in milliseconds.
+        :param start_ms: In point inside the source clip (None means the entire clip).
+        :param end_ms: Out point inside the source clip (None means the entire clip).
+        """
+        animation = animations_dict[role][choice]
+        entire_clip = start_ms is None or end_ms is None
+        if entire_clip:
+            start_ms, end_ms = 0, animation['duration_ms']
+        return {
+            'category': choice,
+            'source': animation['paths'][lip_index],
+            # ScanPath always lists the with lip move file first
+            'lip': 'with_lip_move' if lip_index == 0 else 'without_lip_move',
+            'at_ms': at_ms,
+            'start_ms': start_ms,
+            'end_ms': end_ms,
+            'entire_clip': entire_clip
+        }
+
+    def plan_sequence(self, role, animations_dict=None):
+        """
+        Build the whole timeline for a role in memory without touching any video.
+        Returns a JSON serializable edit decision list (EDL):
+
+            {'role': ..., 'fps': 24, 'duration_ms': ..., 'entries': [
+                {'category', 'source', 'lip', 'at_ms', 'start_ms', 'end_ms', 'entire_clip'}, ...]}
+
+        :param role: 'male' or 'female'.
+        :param animations_dict: Result of ScanPath.scan_animations_directory_with_duration_ms.
+                                Scanned from 'animations' when not given.
+        :return: EDL dictionary.
+        """
+        if animations_dict is None:
+            animations_dict = scan_path.scan_animations_directory_with_duration_ms('animations')
 
         # Initializations
         current_timings = 0
         timeline = []
-        command = ''
         i = 0
-        extra_time = 0
 
         trim_trigger = False
-        speaker_timing = 0
         remaning_clip = 0
 
         # We’ll keep picking choice from these 4 options:
@@ -59,14 +95,12 @@ class Sequencer:
         else:
             possible_choices = ['yes_long', 'fill', 'nod']
             weights = [0.10, 0.80, 0.10]
-        clip_left = 0
 
         turn_time = self.get_turn_time()
 
         if self.iterations==0:
             self.iterations = len(turn_time)
 
-
         if self.is_speaker1_man:
             with_lip = 0
             without_lip = 1
@@ -75,143 +109,183 @@ class Sequencer:
             without_lip = 0
 
         while i < self.iterations:
-            print('-' * 20)
-
             # 1) Pick an animation or use remaining clipped video:
             if remaning_clip != 0:
                 # Continue using the last remaining video
                 animation_duration = remaning_clip
-                print(f"picked {choice} of {animation_duration} ms (the last remaining video)\n")
             else:
                 # Otherwise pick a new random (or fixed index) choice
-                choice = picker.run_weighted_picker(possible_choices, weights)  
-                print('choice', choice)
+                choice = picker.weighted_pick(possible_choices, weights)
                 animation_duration = animations_dict[role][choice]['duration_ms']
-                print(f"picked {choice} of {animation_duration} ms through random choice\n")
 
-            #setting a variable to track how much of clip is used
-            if clip_left==0:
-                clip_left = animation_duration
+            choice_duration = animations_dict[role][choice]['duration_ms']
 
-            # 2) Print the remaining speaking time
-            print(f"remaining speaking time of speaker1 to switch actions "
-                  f"{turn_time[i]} - {current_timings} = {turn_time[i] - current_timings}\n")
-            print("now going inside the condition...\n")
+            # Even turns are speaker 1, odd turns are speaker 2
+            lip_index = with_lip if i % 2 == 0 else without_lip
 
-            # 3) If the entire animation fits before the speaker switches
+            # 2) If the entire animation fits before the speaker switches
             if current_timings + animation_duration < turn_time[i]:
+                if remaning_clip == 0:
+                    entry = self._edl_entry(animations_dict, role, choice, lip_index, current_timings)
+                else:
+                    entry = self._edl_entry(animations_dict, role, choice, lip_index, current_timings,
+                                            start_ms=choice_duration - remaning_clip, end_ms=choice_duration)
+                timeline.append(entry)
                 current_timings += animation_duration
 
-                # Determine if speaker i is “with lip move” or “without lip move”
-                if i % 2 == 0:
-                    if remaning_clip==0:
-                        print(f"adding {choice} with lip move from {remaning_clip} to {animations_dict[role][choice]['duration_ms']}, current time is now {current_timings}\n")
-                        print('remaining clip ', remaning_clip)
-                        # Now adding the the actual video to workspace folder
-                        video_ops.trim_video(output_folder = f'test/{role}', input_path=animations_dict[role][choice]['paths'][with_lip], entire_clip=True)
-                    else:
-                        print(f"adding {choice} with lip move from {animations_dict[role][choice]['duration_ms'] - remaning_clip} to {animations_dict[role][choice]['duration_ms']}, current time is now {current_timings}\n")
-                        print('remaining clip ', remaning_clip)
-                        # Now adding the the actual video to workspace folder
-                        video_ops.trim_video(output_folder = f'test/{role}', input_path=animations_dict[role][choice]['paths'][with_lip], start_ms=animations_dict[role][choice]['duration_ms'] - remaning_clip, end_ms=animations_dict[role][choice]['duration_ms'])
-                else:
-                    if remaning_clip==0:
-                        print(f"adding {choice} without lip move from {remaning_clip} to {animations_dict[role][choice]['duration_ms']}, current time is now {current_timings}\n")
-                        print('remaining clip ', remaning_clip)
-                        # Now adding the the actual video to workspace folder
-                        video_ops.trim_video(output_folder = f'test/{role}', input_path=animations_dict[role][choice]['paths'][without_lip], entire_clip=True)
-                    else:
-                        print(f"adding {choice} without lip move from {animations_dict[role][choice]['duration_ms'] - remaning_clip} to {animations_dict[role][choice]['duration_ms']}, current time is now {current_timings}\n")
-                        print('remaining clip ', remaning_clip)
-                        # Now adding the the actual video to workspace folder
-                        video_ops.trim_video(output_folder = f'test/{role}', input_path=animations_dict[role][choice]['paths'][without_lip], start_ms=animations_dict[role][choice]['duration_ms'] - remaning_clip, end_ms=animations_dict[role][choice]['duration_ms'])
-
-
-                print(f"and remaining time is {turn_time[i] - current_timings}\n")
-                
                 # Since we used the full clip, reset remaning_clip
                 remaning_clip = 0
                 trim_trigger = False
 
             else:
-                # 4) The animation does NOT fit fully => we do “trimming” logic
+                # 3) The animation does NOT fit fully => we do “trimming” logic
 
                 # We will trim the part that fits until speaker switch
                 # leftover clip is what remains after the speaker switches
                 leftover_time = turn_time[i] - current_timings
                 new_remaning_clip = animation_duration - leftover_time
 
-                # Print out the trimming info
-                if i % 2 == 0: #determine if speaker 1 is speaking 
-                    if trim_trigger==True:
-                        print(f"trimming the with lip move video from ({animations_dict[role][choice]['duration_ms']}-{remaning_clip}) = {animations_dict[role][choice]['duration_ms']-remaning_clip} to {leftover_time + (animations_dict[role][choice]['duration_ms']-remaning_clip)} "
-                              f"\n and {'setting' if not trim_trigger else 'unsetting'} the trim trigger "
-                              f"\n and increment turn_time (i += 1)\n")
-
-                        # Now Trimming the actual video
-                        # Now adding the the actual video to workspace folder
-                        video_ops.trim_video(output_folder = f'test/{role}', input_path=animations_dict[role][choice]['paths'][with_lip], start_ms=animations_dict[role][choice]['duration_ms']-remaning_clip, end_ms=(leftover_time + (animations_dict[role][choice]['duration_ms']-remaning_clip)))
-                    else:
-                        print(f"trimming the with lip move video from {remaning_clip} to {leftover_time + remaning_clip} "
-                              f"\n and {'setting' if not trim_trigger else 'unsetting'} the trim trigger "
-                              f"\n and increment turn_time (i += 1)\n")
-
-                        # Now Trimming the actual video
-                        # Now adding the the actual video to workspace folder
-                        video_ops.trim_video(output_folder = f'test/{role}', input_path=animations_dict[role][choice]['paths'][with_lip], start_ms=remaning_clip, end_ms=(leftover_time + remaning_clip))
-
+                if trim_trigger:
+                    start_ms = choice_duration - remaning_clip
                 else:
-                    if trim_trigger==True:
-                        print(f"trimming the without lip move video from ({animations_dict[role][choice]['duration_ms']}-{remaning_clip}) = {animations_dict[role][choice]['duration_ms']-remaning_clip} to {leftover_time + (animations_dict[role][choice]['duration_ms']-remaning_clip)} "
-                              f"\n and {'setting' if not trim_trigger else 'unsetting'} the trim trigger "
-                              f"\n and increment turn_time (i += 1)\n")
-
-                        # Now Trimming the actual video
-                        # Now adding the the actual video to workspace folder
-                        video_ops.trim_video(output_folder = f'test/{role}', input_path=animations_dict[role][choice]['paths'][without_lip], start_ms=animations_dict[role][choice]['duration_ms']-remaning_clip, end_ms=(leftover_time + (animations_dict[role][choice]['duration_ms']-remaning_clip)))
-                    else:
-                        print(f"trimming the without lip move video from {remaning_clip} to {leftover_time + remaning_clip} "
-                              f"\n and {'setting' if not trim_trigger else 'unsetting'} the trim trigger "
-                              f"\n and increment turn_time (i += 1)\n")
-
-                        # Now Trimming the actual video
-                        # Now adding the the actual video to workspace folder
-                        video_ops.trim_video(output_folder = f'test/{role}', input_path=animations_dict[role][choice]['paths'][without_lip], start_ms=remaning_clip, end_ms=(leftover_time + remaning_clip))
+                    start_ms = remaning_clip
 
+                # Zero length turns (e.g. the last segment of the transcript) add nothing
+                if leftover_time > 0:
+                    timeline.append(self._edl_entry(animations_dict, role, choice, lip_index, current_timings,
+                                                    start_ms=start_ms, end_ms=start_ms + leftover_time))
 
                 remaning_clip = new_remaning_clip
+                trim_trigger = True
 
-                clip_left-=remaning_clip
-                print(f"\n\n total clip used remain  = {clip_left - remaning_clip} \n\n")
-
-
-
-                
-                trim_trigger=True
-                
                 # Add the trimmed portion up to the speaker switch
                 current_timings += leftover_time
 
-                # “with lip move” or “without lip move”
-                if i % 2 == 0:
-                    print(f"adding {choice} with lip move, current time is now {current_timings}\n")
-                else:
-                    print(f"adding {choice} without lip move, current time is now {current_timings}\n")
-
-                # Print the leftover
-                print(f"setting the choice and animation duration = {remaning_clip} "
-                      f"of remaining clip of {choice}\n")
-
                 # Move to the next turn
                 i += 1
-                # Continue to the next iteration of the while loop
-                # (We do not want to re-check the if/else with the same i)
                 continue
 
-            # 5) If we finished a turn exactly, you may want to increment i
-            #    (depends on how you want to handle partial overlaps).
+            # 4) If we finished a turn exactly, move to the next turn
             if current_timings == turn_time[i]:
                 i += 1
 
-            # Move to the next iteration
-            # If there's more turn_time left, the loop continues
+        plan = {
+            'role': role,
+            'fps': 24,
+            'duration_ms': current_timings,
+            'entries': timeline
+        }
+        if self.segment_library:
+            plan = self.snap_to_segments(plan, self.segment_library, self.snap_tolerance_ms)
+        return plan
+
+    def snap_to_segments(self, plan, segment_library, tolerance_ms=None):
+        """
+        Move the cut points of a plan onto the segment grid of a SegmentLibrary.
+
+        The in point of every entry is rounded to the nearest segment boundary and its
+        length to whole segments (or to the end of the clip), chosen against the running
+        position of the snapped timeline so the rounding never accumulates: every entry
+        ends within half a segment of its original out point on the timeline, or carries
+        the difference into the next one. Entries shorter than half a segment are dropped
+        (the next entry covers their time). Snapped entries get a 'segment_range'
+        [first, last) of segment indexes, so SegmentLibrary.assemble_track can copy them.
+
+        Entries of clips missing from the library, and with tolerance_ms entries whose cut
+        would move by more than that, keep their in point, get their out point moved to
+        end on the same target, and no 'segment_range'.
+
+        :param plan: EDL returned by plan_sequence.
+        :param tolerance_ms: Largest shift of a cut point. Defaults to no limit, which
+                             snaps every entry of a clip in the library.
+        :return: New EDL dictionary.
+        """
+        fps = plan.get('fps', 24)
+        seg = segment_library.segment_frames
+        to_frame = lambda ms: int(round(ms * fps / 1000.0))
+        to_ms = lambda frame: int(round(frame * 1000.0 / fps))
+        tolerance = None if tolerance_ms is None else tolerance_ms * fps / 1000.0
+
+        entries = []
+        snapped = 0
+        position = 0  # Output frame where the next entry starts
+        for entry in plan['entries']:
+            clip_frames = segment_library.frame_count(entry['source'])
+            start_f = to_frame(entry['start_ms'])
+            target_end = to_frame(entry['at_ms'] + entry['end_ms'] - entry['start_ms'])
+
+            fits = clip_frames is not None
+            if fits:
+                segment_count = -(-clip_frames // seg)
+                first = min(int(round(start_f / float(seg))), segment_count)
+                if to_frame(entry['end_ms']) >= clip_frames:
+                    # Runs to the end of the clip, including its last (partial) segment
+                    last = segment_count
+                    end_f = clip_frames
+                else:
+                    last = min(segment_count, first + max(0, int(round((target_end - position) / float(seg)))))
+                    end_f = min(clip_frames, last * seg)
+                length = max(0, end_f - first * seg)
+                if tolerance is not None:
+                    fits = (abs(first * seg - start_f) <= tolerance
+                            and abs(position + length - target_end) <= tolerance)
+
+            if fits:
+                if length == 0:
+                    continue
+                entries.append(dict(entry, at_ms=to_ms(position), start_ms=to_ms(first * seg),
+                                    end_ms=to_ms(first * seg + length), segment_range=[first, last]))
+                position += length
+                snapped += 1
+            else:
+                # Keep the in point but re-anchor the out point, so the entry still ends on
+                # its target (within the clip) and the timeline stays contiguous
+                end_f = start_f + target_end - position
+                if clip_frames is not None:
+                    end_f = min(end_f, clip_frames)
+                if end_f <= start_f:
+                    continue
+                entries.append(dict(entry, at_ms=to_ms(position), start_ms=to_ms(start_f), end_ms=to_ms(end_f)))
+                position += end_f - start_f
+
+        print(f"[Sequencer] Snapped {snapped} of {len(entries)} {plan['role']} entries "
+              f"to {seg} frame segments")
+        return dict(plan, duration_ms=to_ms(position), entries=entries)
+
+    def save_plan(self, plan, output_path):
+        """
+        Write an EDL returned by plan_sequence to a JSON file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, indent=2)
+        print(f"[Sequencer] Saved {len(plan['entries'])} entries of the {plan['role']} plan -> {output_path}")
+
+    def create_sequence(self, role, max_workers=None, threads_per_job=None):
+        """
+        Plan the timeline for a role and trim every entry into `test/{role}`
+        as sequential videoN.mp4 files.
+
+        :param role: 'male' or 'female'.
+        :param max_workers: When set, trims run concurrently in a pool of this many
+                            ffmpeg processes instead of one after the other.
+        :param threads_per_job: x264 threads per ffmpeg process in the pool.
+        """
+        plan = self.plan_sequence(role)
+
+        if max_workers:
+            video_ops.trim_videos(plan['entries'], output_folder=f'test/{role}',
+                                  max_workers=max_workers, threads_per_job=threads_per_job)
+            return plan
+
+        for entry in plan['entries']:
+            print('-' * 20)
+            print(f"adding {entry['category']} {entry['lip'].replace('_', ' ')} from {entry['start_ms']} "
+                  f"to {entry['end_ms']} at {entry['at_ms']}\n")
+            if entry['entire_clip']:
+                video_ops.trim_video(output_folder = f'test/{role}', input_path=entry['source'], entire_clip=True)
+            else:
+                video_ops.trim_video(output_folder = f'test/{role}', input_path=entry['source'],
+                                     start_ms=entry['start_ms'], end_ms=entry['end_ms'])
+
+        return plan
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import threading
+import subprocess
+
+# Path of the trace file, inherited by worker processes so they append to the same trace
+TRACE_ENV = 'SUBPROCESS_TRACE'
+
+_write_lock = threading.Lock()
+
+def _size(path):
+    """
+    Size in bytes of a file, or of all the files under a folder; 0 if it does not exist.
+    """
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _guess_files(cmd):
+    """
+    Input and output files of an ffmpeg/ffprobe command line: the arguments of -i, and
+    the last argument of ffmpeg (the output) or of ffprobe (the probed file).
+    """
+    args = [str(arg) for arg in cmd]
+    program = os.path.basename(args[0])
+    if program.startswith('ffprobe'):
+        return args[-1:], []
+    inputs = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == '-i']
+    outputs = args[-1:] if len(args) > 1 and not args[-1].startswith(('-', 'pipe:')) else []
+    return inputs, outputs
+
+def start_trace(trace_path):
+    """
+    Start a new trace of every subprocess run through this module, in this process and
+    in the worker processes it starts.
+
+    The trace is in the JSON array format of the Chrome trace viewer, one complete ("X")
+    event per line. The closing bracket is optional in that format, so events are simply
+    appended as processes finish, and the file loads as is in chrome://tracing and
+    ui.perfetto.dev.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+    with open(trace_path, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+    os.environ[TRACE_ENV] = os.path.abspath(trace_path)
+
+def _write_event(event):
+    trace_path = os.environ.get(TRACE_ENV)
+    if not trace_path:
+        return
+    line = json.dumps(event, separators=(',', ':')) + ',\n'
+    # One O_APPEND write per event keeps lines whole across threads and processes
+    with _write_lock:
+        fd = os.open(trace_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if os.lseek(fd, 0, os.SEEK_END) == 0:
+                # Trace started through the environment variable alone
+                line = '[\n' + line
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+class Popen(subprocess.Popen):
+
+    def __init__(self, args, stage=None, inputs=None, outputs=None, **kwargs):
+        """
+        subprocess.Popen that records its child in the trace (see start_trace) once it
+        is reaped by wait() (and so by communicate(), run() or the with statement):
+        command, stage, wall time, user and system CPU time and peak RSS of the child
+        (from os.wait4), and the bytes of its input and output files.
+
+        Reap it with wait(), not a poll() loop: a child reaped by poll() is recorded
+        without CPU time and RSS.
+
+        :param stage: Label the summary groups invocations by (e.g. 'trim').
+                      Defaults to the program name.
+        :param inputs: Input files (or folders). Defaults to the -i arguments.
+        :param outputs: Output files (or folders). Defaults to the last argument of ffmpeg.
+        """
+        guessed_inputs, guessed_outputs = _guess_files(args)
+        self.stage = stage or os.path.basename(str(args[0]))
+        self.trace_inputs = list(guessed_inputs if inputs is None else inputs)
+        self.trace_outputs = list(guessed_outputs if outputs is None else outputs)
+        self.rusage = None
+        self._recorded = False
+        self._input_bytes = sum(_size(str(path)) for path in self.trace_inputs)
+        self._start_time = time.time()
+        self._start = time.perf_counter()
+        super().__init__(args, **kwargs)
+
+    def wait(self, timeout=None):
+        if self.returncode is None and timeout is None and hasattr(os, 'wait4'):
+            try:
+                _, status, self.rusage = os.wait4(self.pid, 0)
+                self.returncode = os.waitstatus_to_exitcode(status)
+            except ChildProcessError:
+                # Already reaped elsewhere; let Popen sort out the return code
+                pass
+        returncode = super().wait(timeout)
+        self._record()
+        return returncode
+
+    def _record(self):
+        if self._recorded:
+            return
+        self._recorded = True
+        wall = time.perf_counter() - self._start
+        event_args = {
+            'cmd': ' '.join(str(arg) for arg in self.args),
+            'returncode': self.returncode,
+            'wall_s': round(wall, 6),
+            'input_bytes': self._input_bytes,
+            'output_bytes': sum(_size(str(path)) for path in self.trace_outputs)
+        }
+        if self.rusage:
+            event_args['cpu_s'] = round(self.rusage.ru_utime + self.rusage.ru_stime, 6)
+            # ru_maxrss is in kilobytes on Linux
+            event_args['max_rss_bytes'] = self.rusage.ru_maxrss * 1024
+        _write_event({
+            'name': self.stage,
+            'cat': os.path.basename(str(self.args[0])),
+            'ph': 'X',
+            'ts': int(self._start_time * 1e6),
+            'dur': int(wall * 1e6),
+            'pid': os.getpid(),
+            'tid': threading.get_native_id(),
+            'args': event_args
+        })
+
+def run(args, stage=None, inputs=None, outputs=None, input=None, check=False, **kwargs):
+    """
+    subprocess.run that records the child in the trace (see Popen). Raises
+    subprocess.CalledProcessError like subprocess.run when check is set.
+    """
+    if input is not None:
+        kwargs['stdin'] = subprocess.PIPE
+    with Popen(args, stage=stage, inputs=inputs, outputs=outputs, **kwargs) as process:
+        try:
+            stdout, stderr = process.communicate(input)
+        except BaseException:
+            process.kill()
+            raise
+        returncode = process.poll()
+    result = subprocess.CompletedProcess(process.args, returncode, stdout, stderr)
+    if check:
+        result.check_returncode()
+    return result
+
+def read_trace(trace_path):
+    """
+    :return: List of the events of a trace.
+    """
+    with open(trace_path, 'r', encoding='utf-8') as f:
+        lines = [line.strip().rstrip(',') for line in f]
+    return [json.loads(line) for line in lines if line.startswith('{')]
+
+def summarize(trace_path):
+    """
+    Per-stage totals of a trace.
+
+    :return: Dictionary of stage -> calls, failed, wall_s, cpu_s, max_rss_bytes,
+             input_bytes and output_bytes.
+    """
+    summary = {}
+    for event in read_trace(trace_path):
+        event_args = event['args']
+        stage = summary.setdefault(event['name'], {
+            'calls': 0, 'failed': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+            'max_rss_bytes': 0, 'input_bytes': 0, 'output_bytes': 0
+        })
+        stage['calls'] += 1
+        stage['failed'] += event_args['returncode'] != 0
+        stage['wall_s'] += event_args['wall_s']
+        stage['cpu_s'] += event_args.get('cpu_s', 0.0)
+        stage['max_rss_bytes'] = max(stage['max_rss_bytes'], event_args.get('max_rss_bytes', 0))
+        stage['input_bytes'] += event_args['input_bytes']
+        stage['output_bytes'] += event_args['output_bytes']
+    return summary
+
+def print_summary(trace_path=None):
+    """
+    Print the per-stage table of a trace (the current one by default), slowest first.
+
+    :return: The summary (see summarize), empty if there is no trace.
+    """
+    trace_path = trace_path or os.environ.get(TRACE_ENV)
+    if not trace_path or not os.path.isfile(trace_path):
+        return {}
+    summary = summarize(trace_path)
+    mb = 1024 * 1024
+    print(f"\n[Telemetry] Subprocesses by stage (trace: {trace_path})")
+    print(f"{'stage':<16}{'calls':>7}{'failed':>8}{'wall s':>10}{'cpu s':>10}{'cpu/wall':>10}"
+          f"{'peak RSS MB':>13}{'in MB':>10}{'out MB':>10}")
+    for name, stage in sorted(summary.items(), key=lambda item: -item[1]['wall_s']):
+        ratio = stage['cpu_s'] / stage['wall_s'] if stage['wall_s'] else 0.0
+        print(f"{name:<16}{stage['calls']:>7}{stage['failed']:>8}{stage['wall_s']:>10.2f}{stage['cpu_s']:>10.2f}"
+              f"{ratio:>10.2f}{stage['max_rss_bytes'] / mb:>13.1f}{stage['input_bytes'] / mb:>10.1f}"
+              f"{stage['output_bytes'] / mb:>10.1f}")
+    return summary
@@ -0,0 +1,88 @@
+import os
+import sys
+import random
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# sequencer loads transcript/transcript.txt relative to the working directory on import
+os.chdir(ROOT)
+
+from sequencer import Sequencer  # noqa: E402
+
+FPS = 24
+
+# Stand-in clip lengths in ms, spanning the 0.93-9.94 s range of the real library
+CLIPS = {
+    'male': {'yes_long': 9940, 'fill': 4170, 'sip_coffee': 6290, 'nod': 930},
+    'female': {'yes_long': 8460, 'fill': 3540, 'nod': 1210}
+}
+
+
+class FakeLibrary:
+
+    def __init__(self, segment_frames=6):
+        self.segment_frames = segment_frames
+        self.frames = {}
+
+    def add(self, path, duration_ms):
+        self.frames[path] = int(round(duration_ms * FPS / 1000.0))
+
+    def frame_count(self, path):
+        return self.frames.get(path)
+
+
+def make_animations(library):
+    animations = {}
+    for role, clips in CLIPS.items():
+        animations[role] = {}
+        for choice, duration_ms in clips.items():
+            paths = [f"animations/{role}/{choice}/_with_lip_move.mp4",
+                     f"animations/{role}/{choice}/_without_lip_move.mp4"]
+            for path in paths:
+                library.add(path, duration_ms)
+            animations[role][choice] = {'duration_ms': duration_ms, 'paths': paths}
+    return animations
+
+
+def make_turn_times(seed, turns=60):
+    rng = random.Random(seed)
+    times, total = [], 0
+    for _ in range(turns):
+        total += rng.randint(1500, 20000)
+        times.append(total)
+    return times
+
+
+@pytest.mark.parametrize('role', ['male', 'female'])
+@pytest.mark.parametrize('seed', range(5))
+def test_snap_to_segments_snaps_every_entry(role, seed):
+    library = FakeLibrary()
+    turn_times = make_turn_times(seed)
+    sequencer = Sequencer(role == 'male', segment_library=library)
+    sequencer.get_turn_time = lambda: turn_times
+
+    random.seed(seed)
+    plan = sequencer.plan_sequence(role, make_animations(library))
+    seg = library.segment_frames
+
+    assert plan['entries']
+    assert all('segment_range' in entry for entry in plan['entries'])
+
+    position = 0
+    for entry in plan['entries']:
+        first, last = entry['segment_range']
+        clip_frames = library.frame_count(entry['source'])
+        start_f = round(entry['start_ms'] * FPS / 1000.0)
+        end_f = round(entry['end_ms'] * FPS / 1000.0)
+        # Contiguous timeline, cuts on the grid (or at the end of the clip)
+        assert round(entry['at_ms'] * FPS / 1000.0) == position
+        assert start_f == first * seg
+        assert end_f == min(last * seg, clip_frames)
+        assert end_f > start_f
+        position += end_f - start_f
+
+    # The rounding never accumulates
+    target_f = round(turn_times[-1] * FPS / 1000.0)
+    assert abs(position - target_f) <= seg
@@ -1,99 +1,77 @@
-import re
-from datetime import timedelta
+from bisect import bisect_right
+import numpy as np
+from transcript_parser import load_transcript
 
 class TranscriptHelper:
     def __init__(self, filepath):
         """
         Initialize the TranscriptHelper by reading and parsing the transcript file.
 
+        Segments are stored column-wise: int32 start / end arrays in milliseconds, an
+        int16 array of speaker codes (indexes into the speaker labels) and the text of
+        every segment as offsets into one shared buffer.
+
         :param filepath: Path to the transcript.txt file.
         """
         self.filepath = filepath
-        self.segments = []  # List to hold each speaking segment
+        self._segments = None  # Dict view of the segments, built on first use
         self._parse_transcript()
+        self._build_index()
+
+    @property
+    def segments(self):
+        """
+        List of segment dictionaries (speaker, start_time, end_time, text), materialized
+        from the columns on first access.
+        """
+        if self._segments is None:
+            self._segments = [self._segment(i) for i in range(len(self._start_array))]
+        return self._segments
 
     def get_total_seconds_from_transcript(self, file_path='transcript.txt'):
         """
         return the total time in second
         """
-        pattern = re.compile(r'^SPEAKER\s+\d+\s+(\d+):(\d+):(\d+):\d+')
-        last_timestamp = None
-        with open(file_path, 'r') as f:
-            for line in f:
-                match = pattern.match(line.strip())
-                if match:
-                    hours, minutes, seconds = map(int, match.groups())
-                    last_timestamp = hours * 3600 + minutes * 60 + seconds
-        return last_timestamp
+        return load_transcript(file_path).total_seconds()
 
     def _parse_transcript(self):
         """
-        Parse the transcript file and populate the segments list with dictionaries
-        containing speaker, start_time, end_time, and text.
-        """
-        # Adjusted regex pattern to match the timestamp format accurately
-        speaker_pattern = re.compile(r'^SPEAKER (\d+) (\d+):(\d+):(\d+):(\d+)$')
-        current_segment = None
-
-        with open(self.filepath, 'r') as file:
-            for line in file:
-                line = line.strip()
-                if not line:
-                    continue  # Skip empty lines
-
-                speaker_match = speaker_pattern.match(line)
-                if speaker_match:
-                    # If there's an ongoing segment, set its end_time to the current speaker's start_time
-                    if current_segment:
-                        current_segment['end_time'] = self._format_time(
-                            speaker_match.group(2),
-                            speaker_match.group(3),
-                            speaker_match.group(4),
-                            speaker_match.group(5)
-                        )
-                        self.segments.append(current_segment)
-
-                    speaker_id = f"Speaker {speaker_match.group(1)}"
-                    start_time = self._format_time(
-                        speaker_match.group(2),
-                        speaker_match.group(3),
-                        speaker_match.group(4),
-                        speaker_match.group(5)
-                    )
-                    current_segment = {
-                        'speaker': speaker_id,
-                        'start_time': start_time,
-                        'end_time': None,
-                        'text': ""
-                    }
-                else:
-                    if current_segment:
-                        current_segment['text'] += line + " "
-
-            # After the loop, add the last segment with end_time same as start_time (or handle differently)
-            if current_segment:
-                # Assuming the last segment ends at its start time; adjust if you have a known end time
-                current_segment['end_time'] = current_segment['start_time']
-                self.segments.append(current_segment)
-
-        # Now, update end_time for each segment based on the next segment's start_time
-        for i in range(len(self.segments) - 1):
-            self.segments[i]['end_time'] = self.segments[i + 1]['start_time']
-        # For the last segment, end_time remains as start_time (zero duration)
-
-    def _format_time(self, hours, minutes, seconds, milliseconds):
-        """
-        Convert time components to total milliseconds.
-
-        :return: Total milliseconds as an integer.
-        """
-        td = timedelta(
-            hours=int(hours),
-            minutes=int(minutes),
-            seconds=int(seconds),
-            milliseconds=int(milliseconds)
-        )
-        return int(td.total_seconds() * 1000)  # Convert to milliseconds
+        Load the compiled transcript (see transcript_parser.load_transcript) and take its
+        segment columns (start / end times, speaker codes and text offsets).
+        """
+        self.transcript = load_transcript(self.filepath)
+        self._speaker_labels = [f"Speaker {label}" for label in self.transcript.speaker_labels]
+        self._speaker_codes = self.transcript.speaker_codes
+        self._start_array = self.transcript.start_ms
+        self._end_array = self.transcript.end_ms
+
+    def _segment(self, index):
+        """
+        Dictionary form of one segment.
+        """
+        return {
+            'speaker': self._speaker_labels[self._speaker_codes[index]],
+            'start_time': int(self._start_array[index]),
+            'end_time': int(self._end_array[index]),
+            'text': self.transcript.text_at(index)
+        }
+
+    def _build_index(self):
+        """
+        Build the lookup structures used by the time queries: start / end lists for
+        bisect, the numeric speaker id of every segment and the per-speaker duration lists.
+        """
+        self._starts = self._start_array.tolist()
+        self._ends = self._end_array.tolist()
+        label_numbers = np.asarray([int(label.split()[-1]) for label in self._speaker_labels],
+                                   dtype=np.int16)
+        self._speaker_id_array = label_numbers[self._speaker_codes]
+
+        durations = (self._end_array - self._start_array).tolist()
+        codes = self._speaker_codes.tolist()
+        self._durations = {}
+        for code, duration in zip(codes, durations):
+            self._durations.setdefault(self._speaker_labels[code], []).append(duration)
 
     def talking_speaker(self):
         """
@@ -101,7 +79,7 @@ class TranscriptHelper:
 
         :return: List of unique speakers.
         """
-        return list(set(segment['speaker'] for segment in self.segments))
+        return list(set(self._speaker_labels))
 
     def duration_of_speaking_ms(self, speaker=None):
         """
@@ -111,20 +89,10 @@ class TranscriptHelper:
         :param speaker: (Optional) Specific speaker to calculate duration for.
         :return: Total duration in milliseconds or a dictionary of durations per speaker.
         """
-        durations = {}
-        for segment in self.segments:
-            current_speaker = segment['speaker']
-            start = segment['start_time']
-            end = segment['end_time'] if segment['end_time'] else start
-            duration = end - start  # Duration in milliseconds
-            if current_speaker in durations:
-                durations[current_speaker].append(duration)
-            else:
-                durations[current_speaker] = [duration]
-
+        # Durations are precomputed by _build_index; hand out copies so callers can't alter them
         if speaker:
-            return durations.get(speaker, [])
-        return durations
+            return list(self._durations.get(speaker, []))
+        return {name: list(durations) for name, durations in self._durations.items()}
 
     def total_duration_ms(self):
         """
@@ -132,11 +100,9 @@ class TranscriptHelper:
 
         :return: Total duration in milliseconds.
         """
-        if not self.segments:
+        if not self._starts:
             return 0
-        start = self.segments[0]['start_time']
-        end = self.segments[-1]['end_time'] if self.segments[-1]['end_time'] else self.segments[-1]['start_time']
-        return end - start
+        return self._ends[-1] - self._starts[0]
 
     def get_conversation(self):
         """
@@ -153,15 +119,43 @@ class TranscriptHelper:
         :param query_time_ms: Time in milliseconds.
         :return: The segment dictionary if found, else None.
         """
-        for segment in self.segments:
-            start = segment['start_time']
-            end = segment['end_time']
-            if end is None:
-                end = start
-            if start <= query_time_ms < end:
-                return segment
+        # Segments are contiguous and sorted by start, so the candidate is the last one
+        # starting at or before the query time (zero length segments never match)
+        index = bisect_right(self._starts, query_time_ms) - 1
+        if index >= 0 and query_time_ms < self._ends[index]:
+            return self.segments[index] if self._segments is not None else self._segment(index)
         return None
 
+    def speakers_at_times_ms(self, query_times_ms):
+        """
+        Vectorized speaker lookup for many timestamps at once.
+
+        :param query_times_ms: Array-like of times in milliseconds.
+        :return: NumPy int16 array of speaker numbers (1 for 'Speaker 1', ...),
+                 0 where nobody is speaking.
+        """
+        query_times_ms = np.asarray(query_times_ms, dtype=np.int64)
+        indices = np.searchsorted(self._start_array, query_times_ms, side='right') - 1
+        valid = indices >= 0
+        clipped = np.where(valid, indices, 0)
+        if len(self._end_array):
+            valid &= query_times_ms < self._end_array[clipped]
+            return np.where(valid, self._speaker_id_array[clipped], 0).astype(np.int16)
+        return np.zeros(query_times_ms.shape, dtype=np.int16)
+
+    def speakers_at_frames(self, fps=24, duration_ms=None):
+        """
+        Speaker number for every video frame of the episode (see speakers_at_times_ms).
+
+        :param fps: Frame rate of the video.
+        :param duration_ms: Length of the video. Defaults to the end of the transcript.
+        :return: NumPy int16 array with one entry per frame.
+        """
+        if duration_ms is None:
+            duration_ms = self._ends[-1] if self._ends else 0
+        frame_count = int(duration_ms * fps // 1000)
+        return self.speakers_at_times_ms(np.arange(frame_count, dtype=np.int64) * 1000 // fps)
+
     def speaker_durations_ms(self):
         """
         Retrieve a dictionary where each key is a speaker and the value is a list of
@@ -0,0 +1,260 @@
+import os
+import re
+import tempfile
+import threading
+from array import array
+import numpy as np
+from file_utils import file_hash
+
+# Bump whenever the layout of the compiled form changes, so older cache files are re-parsed
+CACHE_VERSION = 1
+
+SPEAKER_PATTERN = re.compile(r'^SPEAKER\s+(\d+)\s+(\d+):(\d+):(\d+):(\d+)$')
+
+# Compiled transcripts already loaded by this process, keyed by (path, size, mtime)
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+class Transcript:
+
+    def __init__(self, source_hash, speaker_labels, speaker_codes, start_ms, text, text_offsets):
+        """
+        Compiled form of a transcript, stored column-wise. Every segment runs from its
+        start to the start of the next one; the last segment has zero duration.
+
+        :param source_hash: SHA-1 of the transcript file the columns were parsed from.
+        :param speaker_labels: Speaker numbers as written in the file ('1', '2', ...).
+        :param speaker_codes: int16 array, index into speaker_labels for every segment.
+        :param start_ms: int32 array of segment start times in milliseconds.
+        :param text: UTF-8 text of all segments in one buffer.
+        :param text_offsets: int64 array of len(segments) + 1 byte offsets into text.
+        """
+        self.source_hash = source_hash
+        self.speaker_labels = list(speaker_labels)
+        self.speaker_codes = speaker_codes
+        self.start_ms = start_ms
+        self.text = text
+        self.text_offsets = text_offsets
+        self.end_ms = np.empty_like(start_ms)
+        if len(start_ms):
+            self.end_ms[:-1] = start_ms[1:]
+            self.end_ms[-1] = start_ms[-1]
+
+    def __len__(self):
+        return len(self.start_ms)
+
+    def text_at(self, index):
+        """
+        Text of one segment (every line followed by a space, as TranscriptHelper always had it).
+        """
+        return self.text[self.text_offsets[index]:self.text_offsets[index + 1]].decode('utf-8')
+
+    def speaker_at(self, index):
+        """
+        Speaker number of one segment as written in the file.
+        """
+        return self.speaker_labels[self.speaker_codes[index]]
+
+    def total_seconds(self):
+        """
+        Timestamp of the last speaker turn in whole seconds, None for an empty transcript.
+        """
+        if not len(self.start_ms):
+            return None
+        return int(self.start_ms[-1]) // 1000
+
+    def total_duration_ms(self):
+        """
+        Time from the first to the last speaker turn in milliseconds.
+        """
+        if not len(self.start_ms):
+            return 0
+        return int(self.end_ms[-1] - self.start_ms[0])
+
+    def turn_durations_ms(self, speaker):
+        """
+        Duration of every turn of one speaker, in order.
+
+        :param speaker: Speaker number ('1' or 1).
+        :return: int32 array of durations in milliseconds.
+        """
+        speaker = str(speaker)
+        if speaker not in self.speaker_labels:
+            return np.zeros(0, dtype=np.int32)
+        mask = self.speaker_codes == self.speaker_labels.index(speaker)
+        return (self.end_ms - self.start_ms)[mask]
+
+    def turn_time_ms(self, first_speaker='1', second_speaker='2'):
+        """
+        Running total of the turn durations taken turn by turn (first speaker, second
+        speaker, first speaker, ...), the prefix sums Sequencer.get_turn_time works with.
+
+        :return: int64 array of cumulative times in milliseconds.
+        """
+        first = self.turn_durations_ms(first_speaker)
+        second = self.turn_durations_ms(second_speaker)
+        turns = min(len(first), len(second))
+        interleaved = np.empty(2 * turns, dtype=np.int64)
+        interleaved[0::2] = first[:turns]
+        interleaved[1::2] = second[:turns]
+        return np.cumsum(interleaved)
+
+    def to_segments(self, speaker_prefix='Speaker', last_end=None, seconds=False):
+        """
+        Dictionary form of the segments.
+
+        :param speaker_prefix: Label in front of the speaker number ('Speaker 1', 'SPEAKER 1').
+        :param last_end: End time of the last segment. Defaults to its start time.
+        :param seconds: Times as float seconds instead of integer milliseconds.
+        :return: List of dictionaries with speaker, start_time, end_time and text.
+        """
+        starts = self.start_ms.tolist()
+        ends = self.end_ms.tolist()
+        if seconds:
+            starts = [start / 1000.0 for start in starts]
+            ends = [end / 1000.0 for end in ends]
+        segments = [
+            {
+                'speaker': f"{speaker_prefix} {self.speaker_at(i)}",
+                'start_time': starts[i],
+                'end_time': ends[i],
+                'text': self.text_at(i)
+            }
+            for i in range(len(starts))
+        ]
+        if segments and last_end is not None:
+            segments[-1]['end_time'] = last_end
+        return segments
+
+def cache_path_for(path):
+    """
+    Location of the compiled form of a transcript: next to it, as a hidden .npz file.
+    """
+    directory, filename = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f".{filename}.npz")
+
+def parse_transcript_file(path, source_hash=None):
+    """
+    Parse a transcript file in a single streaming pass.
+
+    :return: Transcript.
+    """
+    starts = array('i')
+    speaker_codes = array('h')
+    text_offsets = array('q', [0])
+    text = bytearray()
+    speaker_labels = []
+    label_codes = {}
+
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue  # Skip empty lines
+
+            speaker_match = SPEAKER_PATTERN.match(line)
+            if speaker_match:
+                # Close the text of the ongoing segment
+                if starts:
+                    text_offsets.append(len(text))
+                label = speaker_match.group(1)
+                if label not in label_codes:
+                    label_codes[label] = len(speaker_labels)
+                    speaker_labels.append(label)
+                speaker_codes.append(label_codes[label])
+                hours, minutes, seconds, milliseconds = map(int, speaker_match.group(2, 3, 4, 5))
+                starts.append(((hours * 60 + minutes) * 60 + seconds) * 1000 + milliseconds)
+            elif starts:
+                text += line.encode('utf-8')
+                text += b" "
+
+    if starts:
+        text_offsets.append(len(text))
+
+    return Transcript(
+        source_hash,
+        speaker_labels,
+        np.frombuffer(speaker_codes, dtype=np.int16),
+        np.frombuffer(starts, dtype=np.int32),
+        bytes(text),
+        np.frombuffer(text_offsets, dtype=np.int64)
+    )
+
+def _read_cache(cache_file, source_hash):
+    """
+    Load a compiled transcript, None if missing, unreadable or built from other content.
+    """
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        with np.load(cache_file) as data:
+            if int(data['version']) != CACHE_VERSION or str(data['source_hash']) != source_hash:
+                return None
+            return Transcript(
+                source_hash,
+                data['speaker_labels'].tolist(),
+                data['speaker_codes'],
+                data['start_ms'],
+                data['text'].tobytes(),
+                data['text_offsets']
+            )
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: Ignoring unreadable transcript cache '{cache_file}': {e}")
+        return None
+
+def _write_cache(cache_file, transcript):
+    """
+    Write the compiled form atomically (via a temp file unique to this writer, as
+    processes compiling the same transcript may race).
+    """
+    temp_file = None
+    try:
+        fd, temp_file = tempfile.mkstemp(prefix=f".{os.path.basename(cache_file)}.", suffix='.tmp',
+                                         dir=os.path.dirname(os.path.abspath(cache_file)))
+        os.chmod(temp_file, 0o644)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                version=np.array(CACHE_VERSION),
+                source_hash=np.array(transcript.source_hash),
+                speaker_labels=np.array(transcript.speaker_labels, dtype=str),
+                speaker_codes=transcript.speaker_codes,
+                start_ms=transcript.start_ms,
+                text=np.frombuffer(transcript.text, dtype=np.uint8),
+                text_offsets=transcript.text_offsets
+            )
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: Could not write transcript cache '{cache_file}': {e}")
+    finally:
+        if temp_file and os.path.exists(temp_file):
+            os.remove(temp_file)
+
+def load_transcript(path='transcript/transcript.txt', use_cache=True):
+    """
+    Compiled transcript of a file. Each process parses a file at most once; with
+    use_cache the compiled form is also kept next to the file, keyed by the file's
+    content hash, so later stages and reruns skip parsing altogether.
+
+    :param path: Path to the transcript.txt file.
+    :param use_cache: Read and write the compiled form on disk.
+    :return: Transcript.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, use_cache)
+    with _loaded_lock:
+        if memo_key in _loaded:
+            return _loaded[memo_key]
+
+    source_hash = file_hash(path)
+    transcript = None
+    if use_cache:
+        transcript = _read_cache(cache_path_for(path), source_hash)
+    if transcript is None:
+        transcript = parse_transcript_file(path, source_hash)
+        if use_cache:
+            _write_cache(cache_path_for(path), transcript)
+
+    with _loaded_lock:
+        _loaded[memo_key] = transcript
+    return transcript
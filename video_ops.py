@@ -1,16 +1,49 @@
 import os
 import shutil
+import tempfile
 import subprocess
+import subprocess_runner
+from concurrent.futures import ThreadPoolExecutor
+from media_probe import MediaProbe
+from re_encode import is_mezzanine
+
+# Stream parameters of the head / tail encode of a smart cut; only sources with the same
+# ones are spliced with it (ffprobe profile name, pixel format)
+SPLICE_PROFILE = 'High'
+SPLICE_PIX_FMT = 'yuv420p'
 
 class VideoOps:
-    def __init__(self):
-        pass
+    def __init__(self, smart_cut=False, fps=24, segment_cache=None):
+        """
+        :param smart_cut: If True, trims stream-copy the keyframe aligned part of a cut
+                          and only re-encode the partial GOPs at its head and tail.
+                          Always done for mezzanine sources.
+        :param fps: Frame rate every trim is aligned to.
+        :param segment_cache: Optional SegmentCache; trims already rendered by any earlier
+                              run are linked from it instead of running ffmpeg again.
+        """
+        self.smart_cut = smart_cut
+        self.fps = fps
+        self.segment_cache = segment_cache
+        self.probe = MediaProbe()
+
+    def _encode_profile(self):
+        """
+        Every setting that changes the bytes of a trimmed segment (part of the segment cache key).
+        """
+        return f"libx264-slow-crf18-aac-{self.fps}fps{'-smart' if self.smart_cut else ''}"
 
     def _get_next_video_name(self, output_folder):
         """
         Determines the next video file name in the sequence 
         (e.g., video1.mp4, video2.mp4, etc.)
         """
+        return f"video{self._get_next_video_number(output_folder)}.mp4"
+
+    def _get_next_video_number(self, output_folder):
+        """
+        Determines the next free number of the videoN sequence in output_folder.
+        """
         existing_videos = [
             f for f in os.listdir(output_folder)
             if f.startswith("video") and f.endswith(('.mp4', '.avi', '.mov', '.mkv'))
@@ -24,10 +57,10 @@ class VideoOps:
                     max_num = num
             except ValueError:
                 pass
-        next_num = max_num + 1
-        return f"video{next_num}.mp4"
+        return max_num + 1
 
-    def trim_video(self, input_path, output_folder='test', start_ms=None, end_ms=None, entire_clip=False):
+    def trim_video(self, input_path, output_folder='test', start_ms=None, end_ms=None, entire_clip=False,
+                   output_path=None, threads=None):
         """
         Trims (precisely) a segment from the input video based on start and end times in milliseconds,
         or copies the entire video if `entire_clip` is True.
@@ -38,17 +71,21 @@ class VideoOps:
         :param start_ms: Start time in milliseconds (if trimming).
         :param end_ms: End time in milliseconds (if trimming).
         :param entire_clip: If True, copies the entire video. Defaults to False.
+        :param output_path: Explicit output file. Defaults to the next videoN.mp4 in output_folder.
+        :param threads: x264 thread budget for this encode. Defaults to ffmpeg's own choice.
+        :return: Path of the processed video.
         """
         # Validate input file existence
         if not os.path.isfile(input_path):
             raise FileNotFoundError(f"The input video file '{input_path}' does not exist.")
 
-        # Ensure output folder exists
-        os.makedirs(output_folder, exist_ok=True)
-
         # Determine output file name
-        output_filename = self._get_next_video_name(output_folder)
-        output_path = os.path.join(output_folder, output_filename)
+        if output_path is None:
+            os.makedirs(output_folder, exist_ok=True)
+            output_filename = self._get_next_video_name(output_folder)
+            output_path = os.path.join(output_folder, output_filename)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
 
         # If entire_clip is True, just copy the file
         if entire_clip:
@@ -57,7 +94,7 @@ class VideoOps:
                 print(f"[FFmpeg] Copied entire clip -> {output_path}")
             except Exception as e:
                 print(f"[FFmpeg] Error copying file: {e}")
-            return
+            return output_path
 
         # Otherwise, we do a precise trim
         if start_ms is None or end_ms is None:
@@ -68,6 +105,24 @@ class VideoOps:
         if start_ms >= end_ms:
             raise ValueError("start_ms must be < end_ms.")
 
+        cache_key = None
+        if self.segment_cache:
+            cache_key = self.segment_cache.make_key(input_path, start_ms, end_ms, self._encode_profile())
+            if self.segment_cache.fetch(cache_key, output_path):
+                print(f"[FFmpeg] Reused cached {start_ms}ms to {end_ms}ms -> {output_path}")
+                return output_path
+            # Never let ffmpeg truncate a file that may share its inode with a cache entry
+            if os.path.lexists(output_path):
+                os.remove(output_path)
+
+        # Mezzanine sources have a keyframe on (nearly) every cut, so they are always
+        # cut by stream copy
+        smart_cut = self.smart_cut or is_mezzanine(input_path)
+        if smart_cut and self._smart_trim(input_path, output_path, start_ms, end_ms, threads):
+            if cache_key:
+                self.segment_cache.store(cache_key, output_path)
+            return output_path
+
         start_sec = start_ms / 1000.0
         end_sec = end_ms / 1000.0
         duration_sec = end_sec - start_sec
@@ -84,15 +139,202 @@ class VideoOps:
             "-crf", "18",
             "-c:a", "aac",
             "-r", "24",          # force 24 fps
-            output_path
         ]
+        if threads:
+            ffmpeg_cmd += ["-threads", str(threads)]
+        ffmpeg_cmd.append(output_path)
 
         try:
-            subprocess.run(ffmpeg_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            subprocess_runner.run(ffmpeg_cmd, stage='trim', check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             print(f"[FFmpeg] Trimmed {start_ms}ms to {end_ms}ms at 24fps -> {output_path}")
+            if cache_key:
+                self.segment_cache.store(cache_key, output_path)
         except subprocess.CalledProcessError as e:
             print("[FFmpeg] Error during trimming:")
             print(e.stderr.decode('utf-8', errors='ignore'))
+        return output_path
+
+    def get_keyframe_info(self, input_path):
+        """
+        Retrieve the codec, keyframe timestamps and duration of a video (see MediaProbe).
+
+        :param input_path: Path to the video file.
+        :return: (codec name, sorted list of keyframe times in seconds, duration in seconds)
+                 or None if probing failed.
+        """
+        media = self.probe.probe(input_path)
+        if not media or not media['keyframes']:
+            return None
+        return media['codec'], media['keyframes'], media['duration']
+
+    def _can_splice(self, media):
+        """
+        True if the head / tail encode of _smart_trim produces the same stream as the
+        copied GOPs: H.264 High profile, yuv420p, on the frame grid of self.fps, at an
+        even resolution (the head / tail are encoded at the source resolution). Anything
+        else would put a different SPS/PPS mid-stream, or map keyframes to the wrong frames.
+        """
+        if not media or not media['keyframes'] or media['codec'] != 'h264':
+            return False
+        return (
+            media['frame_rate'] is not None and abs(media['frame_rate'] - self.fps) < 0.01
+            and media['pix_fmt'] == SPLICE_PIX_FMT
+            and media['profile'] == SPLICE_PROFILE
+            and bool(media['width']) and bool(media['height'])
+            and media['width'] % 2 == 0 and media['height'] % 2 == 0
+        )
+
+    def _run_ffmpeg(self, cmd):
+        """
+        Run an ffmpeg command, returning True on success.
+        """
+        try:
+            subprocess_runner.run(cmd, stage='smart_cut', check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            return True
+        except subprocess.CalledProcessError as e:
+            print("[FFmpeg] Error during smart cut:")
+            print(e.stderr.decode('utf-8', errors='ignore'))
+            return False
+
+    def _smart_trim(self, input_path, output_path, start_ms, end_ms, threads=None):
+        """
+        Frame accurate trim that avoids re-encoding wherever the cut allows it.
+
+        The cut is aligned to the frame grid, then split at the first keyframe at or after
+        its start and the last keyframe (or end of file) at or before its end. The
+        GOP aligned middle is stream-copied; only the partial GOPs at the head and tail
+        are re-encoded. A cut that starts on a keyframe and ends on a keyframe (or the end
+        of the file) is a pure stream copy.
+
+        :return: True if the trim was written, False if the cut has no keyframe aligned
+                 middle (or the source does not conform to the head / tail encode, see
+                 _can_splice) and needs a regular re-encode.
+        """
+        media = self.probe.probe(input_path)
+        if not self._can_splice(media):
+            return False
+        keyframes, duration = media['keyframes'], media['duration']
+
+        to_frame = lambda ms: int(round(ms * self.fps / 1000.0))
+        start_f = to_frame(start_ms)
+        end_f = to_frame(end_ms)
+        total_f = to_frame(duration * 1000)
+        key_f = sorted({to_frame(t * 1000) for t in keyframes})
+
+        # Keyframes and the end of the file are the only places a copied run can stop
+        boundaries = key_f + ([total_f] if end_f >= total_f else [])
+        mid_start = next((k for k in key_f if k >= start_f), None)
+        mid_end = max((b for b in boundaries if b <= end_f), default=None)
+        if mid_start is None or mid_end is None or mid_start >= mid_end:
+            return False
+
+        sec = lambda frame: frame / float(self.fps)
+        start_sec = sec(start_f)
+        duration_sec = sec(end_f - start_f)
+
+        # Pure stream copy: the cut is GOP aligned on both ends
+        if mid_start == start_f and mid_end == end_f:
+            ok = self._run_ffmpeg([
+                "ffmpeg", "-y",
+                "-ss", str(start_sec), "-i", input_path,
+                "-t", str(duration_sec),
+                "-frames:v", str(end_f - start_f),
+                "-c", "copy",
+                "-avoid_negative_ts", "make_zero",
+                output_path
+            ])
+            if ok:
+                print(f"[FFmpeg] Stream-copied {start_ms}ms to {end_ms}ms -> {output_path}")
+            return ok
+
+        work_dir = tempfile.mkdtemp(prefix="smart_cut_", dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            parts = []
+            for part_start, part_end, copy in ((start_f, mid_start, False),
+                                                (mid_start, mid_end, True),
+                                                (mid_end, end_f, False)):
+                if part_end <= part_start:
+                    continue
+                part_path = os.path.join(work_dir, f"part{len(parts)}.ts")
+                # Annex B parts carry their parameter sets in band, so the copied GOPs
+                # and the freshly encoded head / tail can be joined without re-encoding
+                cmd = ["ffmpeg", "-y",
+                       "-ss", str(sec(part_start)), "-i", input_path,
+                       "-frames:v", str(part_end - part_start),
+                       "-an"]
+                if copy:
+                    cmd += ["-c:v", "copy", "-bsf:v", "h264_mp4toannexb"]
+                else:
+                    cmd += ["-c:v", "libx264", "-preset", "slow", "-crf", "18",
+                            "-profile:v", SPLICE_PROFILE.lower(), "-pix_fmt", SPLICE_PIX_FMT,
+                            "-r", str(self.fps)]
+                    if threads:
+                        cmd += ["-threads", str(threads)]
+                cmd += ["-f", "mpegts", part_path]
+                if not self._run_ffmpeg(cmd):
+                    return False
+                parts.append(part_path)
+
+            list_file = os.path.join(work_dir, "parts.txt")
+            with open(list_file, 'w', encoding='utf-8') as f:
+                for part_path in parts:
+                    f.write(f"file '{part_path}'\n")
+
+            ok = self._run_ffmpeg([
+                "ffmpeg", "-y",
+                "-f", "concat", "-safe", "0", "-i", list_file,
+                "-ss", str(start_sec), "-t", str(duration_sec), "-i", input_path,
+                "-map", "0:v:0",
+                "-map", "1:a?",
+                "-c:v", "copy",
+                "-c:a", "aac",
+                output_path
+            ])
+            if ok:
+                print(f"[FFmpeg] Smart-cut {start_ms}ms to {end_ms}ms "
+                      f"(copied {sec(mid_end - mid_start):.3f}s of {duration_sec:.3f}s) -> {output_path}")
+            return ok
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def trim_videos(self, entries, output_folder='test', max_workers=None, threads_per_job=None):
+        """
+        Trims many segments concurrently with a bounded worker pool.
+        Output names (videoN.mp4) are assigned up front in the order of `entries`,
+        so the sequence in output_folder never depends on which encode finishes first.
+
+        :param entries: EDL entries (see Sequencer.plan_sequence) with 'source', 'start_ms',
+                        'end_ms' and 'entire_clip' keys.
+        :param output_folder: Folder to save the processed videos. Defaults to 'test'.
+        :param max_workers: Number of concurrent ffmpeg processes. Defaults to the CPU count.
+        :param threads_per_job: x264 threads per ffmpeg process. Defaults to an even
+                                share of the CPUs across the workers.
+        :return: List of output paths in the order of `entries`.
+        """
+        if not entries:
+            return []
+
+        cpu_count = os.cpu_count() or 1
+        max_workers = max_workers or cpu_count
+        threads_per_job = threads_per_job or max(1, cpu_count // max_workers)
+
+        os.makedirs(output_folder, exist_ok=True)
+        first_num = self._get_next_video_number(output_folder)
+        output_paths = [
+            os.path.join(output_folder, f"video{first_num + n}.mp4") for n in range(len(entries))
+        ]
+
+        def run(job):
+            entry, output_path = job
+            if entry.get('entire_clip'):
+                return self.trim_video(entry['source'], entire_clip=True, output_path=output_path)
+            return self.trim_video(entry['source'], start_ms=entry['start_ms'], end_ms=entry['end_ms'],
+                                   output_path=output_path, threads=threads_per_job)
+
+        print(f"[FFmpeg] Trimming {len(entries)} clips with {max_workers} workers "
+              f"x {threads_per_job} threads -> {output_folder}")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run, zip(entries, output_paths)))
 
 
 